@@ -1,47 +1,165 @@
 import json
 import os
-import psycopg2
 import boto3
 from datetime import datetime
 
-DB_HOST = os.environ.get('DB_HOST')
-DB_NAME = os.environ.get('DB_NAME')
-DB_USER = os.environ.get('DB_USER')
-DB_PASSWORD = os.environ.get('DB_PASSWORD')
+from psycopg2.extras import execute_values
+
+from db_layer import get_db_connection, release_db_connection
 
 sns_client = boto3.client("sns")
 SNS_TOPIC_ARN = os.environ.get("SNS_TOPIC_ARN")
 
-def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
+# Baris yang commit telat bisa punya updated_at sedikit di bawah watermark,
+# jadi setiap run membaca ulang jendela ini (duplikat disaring state table)
+LOWSTOCK_WATERMARK_LAG_SECONDS = int(os.environ.get("LOWSTOCK_WATERMARK_LAG_SECONDS", "60"))
+# Batas baris per digest, SNS message maksimal 256 KB
+LOWSTOCK_DIGEST_MAX_ITEMS = int(os.environ.get("LOWSTOCK_DIGEST_MAX_ITEMS", "200"))
+
+JOB_NAME = "detects_lowstock"
+
+
+def read_watermark(cur):
+    """
+    Lock and return the detector watermark (-infinity, read back as
+    datetime.min, on the first run).
+    The row lock also keeps two overlapping runs from sending the same digest.
+    """
+    cur.execute("""
+        INSERT INTO job_watermarks (job_name, watermark)
+        VALUES (%s, '-infinity')
+        ON CONFLICT (job_name) DO NOTHING
+    """, (JOB_NAME,))
+    cur.execute(
+        "SELECT watermark FROM job_watermarks WHERE job_name = %s FOR UPDATE",
+        (JOB_NAME,)
     )
+    return cur.fetchone()[0]
+
+
+def find_changed_low_stock(cur, watermark):
+    """
+    Low stock rows changed since the watermark, with stock sold through hot
+    SKU shards subtracted (inventory_available). Candidates come from
+    idx_inventory_low_stock plus the shards touched since the watermark,
+    since shard sales do not move inventory.updated_at.
+    """
+    cur.execute("""
+        WITH since AS (
+            SELECT %s::timestamp - make_interval(secs => %s) AS ts
+        )
+        SELECT a.product_id, a.product_name, a.stock_quantity, a.alert_threshold, a.updated_at
+        FROM inventory_available a
+        WHERE a.product_id IN (
+            SELECT product_id FROM inventory, since
+            WHERE stock_quantity <= alert_threshold AND updated_at > since.ts
+            UNION
+            SELECT product_id FROM inventory_stock_shards, since
+            WHERE updated_at > since.ts
+        )
+        AND a.stock_quantity <= a.alert_threshold
+        AND a.updated_at > (SELECT ts FROM since)
+        ORDER BY a.stock_quantity, a.product_id
+    """, (watermark, LOWSTOCK_WATERMARK_LAG_SECONDS))
+    return cur.fetchall()
+
+
+def clear_recovered(cur):
+    """
+    Forget products that were restocked above their threshold, so the next
+    drop is alerted again. The state table only holds alerted products.
+    """
+    cur.execute("""
+        DELETE FROM low_stock_digest_state s
+        USING inventory_available i
+        WHERE i.product_id = s.product_id
+        AND i.stock_quantity > i.alert_threshold
+    """)
+    return cur.rowcount
+
+
+def claim_alerts(cur, rows):
+    """
+    Record alerted stock per product. Returns the product_ids that are new
+    or dropped below the stock they were last alerted at.
+    """
+    if not rows:
+        return set()
+    claimed = execute_values(cur, """
+        INSERT INTO low_stock_digest_state (product_id, alerted_stock, alerted_at)
+        VALUES %s
+        ON CONFLICT (product_id) DO UPDATE
+        SET alerted_stock = EXCLUDED.alerted_stock,
+            alerted_at = EXCLUDED.alerted_at
+        WHERE low_stock_digest_state.alerted_stock > EXCLUDED.alerted_stock
+        RETURNING product_id
+    """, [(row[0], row[2], datetime.now()) for row in rows], fetch=True)
+    return {row[0] for row in claimed}
+
+
+def build_digest(alerts):
+    lines = [
+        "Low Stock Digest",
+        "",
+        f"Generated : {datetime.now().isoformat()}",
+        f"Products  : {len(alerts)}",
+        ""
+    ]
+    for product_id, product_name, stock, threshold, _ in alerts[:LOWSTOCK_DIGEST_MAX_ITEMS]:
+        lines.append(f"- {product_id} {product_name}: {stock} left (threshold {threshold})")
+    if len(alerts) > LOWSTOCK_DIGEST_MAX_ITEMS:
+        lines.append(f"... and {len(alerts) - LOWSTOCK_DIGEST_MAX_ITEMS} more")
+    return "\n".join(lines)
+
 
 def lambda_handler(event, context):
-    print(f"=== CUSTOM LAMBDA FUNCTION STARTS ===")
+    print("=== LOW STOCK DETECTION STARTS ===")
 
     conn = get_db_connection()
     cur = conn.cursor()
 
-    cur.execute("""
-            SELECT stock_quantity, product_name
-            FROM inventory
-            WHERE stock_quantity <= 10
-        """)
-
-    result = cur.fetchall()
-    
-    if not result:
-        response = sns_client.publish(
-            TopicArn=SNS_TOPIC_ARN,
-            Subject="Low Stock Detected",
-            Message=result
+    try:
+        watermark = read_watermark(cur)
+        rows = find_changed_low_stock(cur, watermark)
+        recovered = clear_recovered(cur)
+        claimed = claim_alerts(cur, rows)
+        alerts = [row for row in rows if row[0] in claimed]
+
+        # Watermark hanya maju ke updated_at terbesar yang benar-benar terbaca
+        new_watermark = max([row[4] for row in rows] + [watermark])
+        cur.execute(
+            "UPDATE job_watermarks SET watermark = %s, updated_at = now() WHERE job_name = %s",
+            (new_watermark, JOB_NAME)
         )
-        continue
 
-    return {
+        message_id = None
+        if alerts:
+            response = sns_client.publish(
+                TopicArn=SNS_TOPIC_ARN,
+                Subject=f"Low Stock Digest: {len(alerts)} product(s)",
+                Message=build_digest(alerts)
+            )
+            message_id = response.get("MessageId")
+
+        # Commit setelah publish: kalau SNS gagal, run berikutnya mengulang
+        conn.commit()
+
+        print(f"Scanned {len(rows)} changed low stock rows, alerted {len(alerts)}, recovered {recovered}")
+
+        return {
             "status": "stock detection finished",
-    }
\ No newline at end of file
+            "scanned": len(rows),
+            "alerted": [row[0] for row in alerts],
+            "recovered": recovered,
+            "watermark": new_watermark.isoformat(),
+            "message_id": message_id
+        }
+
+    except Exception as e:
+        conn.rollback()
+        print(f"Error detecting low stock: {str(e)}")
+        raise
+
+    finally:
+        cur.close()
+        release_db_connection(conn)
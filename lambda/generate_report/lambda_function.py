@@ -1,129 +1,803 @@
+import csv
+import gzip
+import io
 import json
 import os
+import time
 import boto3
-import psycopg2
 from datetime import datetime, timedelta
 import pandas as pd
+import psycopg2
+from concurrent.futures import ThreadPoolExecutor
 from io import BytesIO
+from openpyxl import Workbook
+
+from db_layer import get_db_connection, release_db_connection
 
-DB_HOST = os.environ.get('DB_HOST')
-DB_NAME = os.environ.get('DB_NAME')
-DB_USER = os.environ.get('DB_USER')
-DB_PASSWORD = os.environ.get('DB_PASSWORD')
 S3_BUCKET = os.environ.get('S3_BUCKET')
 
+# Streaming mode: baris per fetch dari named cursor dan ukuran part multipart
+REPORT_STREAM_ITERSIZE = int(os.environ.get('REPORT_STREAM_ITERSIZE', 5000))
+REPORT_MULTIPART_PART_SIZE = max(int(os.environ.get('REPORT_MULTIPART_PART_SIZE', 8 * 1024 * 1024)), 5 * 1024 * 1024)
+# openpyxl write-only tetap men-spool XML sheet ke /tmp sebelum masuk zip
+# (~0.5 KB per baris), jadi xlsx dibatasi; hari yang lebih besar pakai csv
+REPORT_XLSX_MAX_ROWS = int(os.environ.get('REPORT_XLSX_MAX_ROWS', 500000))
+
+# Backfill rentang tanggal: batas hari per invoke dan upload paralel
+REPORT_MAX_DAYS = int(os.environ.get('REPORT_MAX_DAYS', 92))
+REPORT_UPLOAD_CONCURRENCY = int(os.environ.get('REPORT_UPLOAD_CONCURRENCY', 4))
+
 s3_client = boto3.client('s3')
 
-def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+DETAIL_COLUMNS = [
+    'order_id', 'created_at', 'customer_id', 'status', 'total_amount',
+    'product_id', 'product_name', 'quantity', 'price', 'line_total'
+]
 
-def lambda_handler(event, context):
+# =====================================================
+# STREAMING DETAIL REPORT
+# =====================================================
+# Full order detail for a day can be millions of rows. Rows come from a
+# server-side cursor in itersize batches, are written incrementally
+# (openpyxl write-only or gzip CSV) and leave the Lambda as S3 multipart
+# parts, so memory stays at roughly one part regardless of row count.
+# gzip CSV is also constant on disk. openpyxl spools each sheet's XML to
+# /tmp before zipping it, so xlsx is capped at REPORT_XLSX_MAX_ROWS.
+
+class S3MultipartWriter:
     """
-    Generate daily order report
+    Write-only, non-seekable file object backed by an S3 multipart upload.
+    Buffers up to part_size bytes, then uploads them as the next part.
     """
+
+    def __init__(self, bucket, key, content_type, part_size=REPORT_MULTIPART_PART_SIZE):
+        self.bucket = bucket
+        self.key = key
+        self.part_size = part_size
+        self.buffer = bytearray()
+        self.parts = []
+        self.position = 0
+        self.closed = False
+        self.upload_id = s3_client.create_multipart_upload(
+            Bucket=bucket, Key=key, ContentType=content_type
+        )['UploadId']
+
+    def writable(self):
+        return True
+
+    def readable(self):
+        return False
+
+    def seekable(self):
+        return False
+
+    def seek(self, *args):
+        raise io.UnsupportedOperation('S3MultipartWriter is not seekable')
+
+    def tell(self):
+        return self.position
+
+    def write(self, data):
+        self.buffer.extend(data)
+        self.position += len(data)
+        if len(self.buffer) >= self.part_size:
+            self._upload_part()
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def _upload_part(self):
+        part_number = len(self.parts) + 1
+        response = s3_client.upload_part(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            PartNumber=part_number,
+            Body=bytes(self.buffer)
+        )
+        self.parts.append({'PartNumber': part_number, 'ETag': response['ETag']})
+        self.buffer = bytearray()
+
+    def close(self):
+        if self.closed:
+            return
+        # Part terakhir boleh < 5 MB; upload kosong tetap butuh satu part
+        if self.buffer or not self.parts:
+            self._upload_part()
+        s3_client.complete_multipart_upload(
+            Bucket=self.bucket,
+            Key=self.key,
+            UploadId=self.upload_id,
+            MultipartUpload={'Parts': self.parts}
+        )
+        self.closed = True
+
+    def abort(self):
+        if self.closed:
+            return
+        self.closed = True
+        try:
+            s3_client.abort_multipart_upload(Bucket=self.bucket, Key=self.key, UploadId=self.upload_id)
+        except Exception as e:
+            print(f"Could not abort multipart upload {self.key}: {str(e)}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+
+def stream_order_detail(conn, start_ts, end_ts):
+    """
+    Yield order detail rows for [start_ts, end_ts) from a named
+    (server-side) cursor, REPORT_STREAM_ITERSIZE rows per round trip.
+    """
+    cur = conn.cursor(name='report_order_detail')
+    cur.itersize = REPORT_STREAM_ITERSIZE
     try:
-        report_date = datetime.now().date()
-        start_date = report_date - timedelta(days=1)
-        
-        conn = get_db_connection()
-        
-        # Daily orders summary
-        query = """
-            SELECT 
+        cur.execute("""
+            SELECT
+                o.order_id,
+                o.created_at,
+                o.customer_id,
                 o.status,
-                COUNT(*) as order_count,
-                SUM(o.total_amount) as total_revenue
+                o.total_amount,
+                oi.product_id,
+                i.product_name,
+                oi.quantity,
+                oi.price,
+                oi.quantity * oi.price AS line_total
             FROM orders o
-            WHERE DATE(o.order_date) = %s
-            GROUP BY o.status
-        """
+            JOIN order_items oi ON oi.order_id = o.order_id AND oi.created_at = o.created_at
+            LEFT JOIN inventory i ON i.product_id = oi.product_id
+            WHERE o.created_at >= %(start)s AND o.created_at < %(end)s
+            AND oi.created_at >= %(start)s AND oi.created_at < %(end)s
+            ORDER BY o.created_at, o.order_id, oi.product_id
+        """, {'start': start_ts, 'end': end_ts})
+        for row in cur:
+            yield row
+    finally:
+        cur.close()
+
+
+# Batas baris per sheet Excel (termasuk header)
+XLSX_MAX_ROWS = 1048576
+
+
+def write_detail_xlsx(rows, fileobj):
+    """
+    Write rows to 'Order Detail', continuing on 'Order Detail 2', 3, ...
+    whenever a sheet reaches Excel's row limit. Raises ValueError past
+    REPORT_XLSX_MAX_ROWS, before the /tmp spool outgrows the Lambda.
+    """
+    workbook = Workbook(write_only=True)
+    sheet = None
+    sheet_rows = XLSX_MAX_ROWS
+    count = 0
+    for row in rows:
+        if count >= REPORT_XLSX_MAX_ROWS:
+            raise ValueError(f'More than {REPORT_XLSX_MAX_ROWS} rows (REPORT_XLSX_MAX_ROWS), use format csv')
+        if sheet_rows >= XLSX_MAX_ROWS:
+            sheet_no = len(workbook.worksheets) + 1
+            sheet = workbook.create_sheet('Order Detail' if sheet_no == 1 else f'Order Detail {sheet_no}')
+            sheet.append(DETAIL_COLUMNS)
+            sheet_rows = 1
+        sheet.append(row)
+        sheet_rows += 1
+        count += 1
+    if sheet is None:
+        workbook.create_sheet('Order Detail').append(DETAIL_COLUMNS)
+    workbook.save(fileobj)
+    return count
+
+
+def write_detail_csv_gz(rows, fileobj):
+    count = 0
+    with gzip.GzipFile(fileobj=fileobj, mode='wb') as gz:
+        with io.TextIOWrapper(gz, encoding='utf-8', newline='') as text:
+            writer = csv.writer(text)
+            writer.writerow(DETAIL_COLUMNS)
+            for row in rows:
+                writer.writerow(row)
+                count += 1
+    return count
+
+
+def count_order_detail(conn, start_ts, end_ts):
+    cur = conn.cursor()
+    try:
+        cur.execute("""
+            SELECT COUNT(*) FROM order_items
+            WHERE created_at >= %s AND created_at < %s
+        """, (start_ts, end_ts))
+        return cur.fetchone()[0]
+    finally:
+        cur.close()
+
+
+def generate_detail_report(report_day, fmt='xlsx'):
+    """
+    {"mode": "stream", "format": "xlsx" | "csv", "date": "YYYY-MM-DD"}
+    Full order detail for one day, streamed to S3. xlsx is refused up
+    front for days over REPORT_XLSX_MAX_ROWS.
+    """
+    if fmt == 'csv':
+        report_key = f"reports/detail/order-detail-{report_day}.csv.gz"
+        content_type = 'application/gzip'
+        write_rows = write_detail_csv_gz
+    else:
+        report_key = f"reports/detail/order-detail-{report_day}.xlsx"
+        content_type = 'application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
+        write_rows = write_detail_xlsx
+    
+    start_ts = datetime.combine(report_day, datetime.min.time())
+    end_ts = start_ts + timedelta(days=1)
+    
+    conn = get_db_connection(readonly=True)
+    try:
+        if fmt != 'csv':
+            row_count = count_order_detail(conn, start_ts, end_ts)
+            if row_count > REPORT_XLSX_MAX_ROWS:
+                conn.rollback()
+                return {
+                    'status': 'error',
+                    'message': f'{row_count} rows exceed REPORT_XLSX_MAX_ROWS ({REPORT_XLSX_MAX_ROWS}); use "format": "csv"',
+                    'report_date': str(report_day),
+                    'rows': row_count
+                }
+        
+        with S3MultipartWriter(S3_BUCKET, report_key, content_type) as writer:
+            row_count = write_rows(stream_order_detail(conn, start_ts, end_ts), writer)
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        release_db_connection(conn)
+    
+    print(f"Detail report {report_key}: {row_count} rows, {len(writer.parts)} parts")
+    return {
+        'status': 'success',
+        'message': 'Detail report generated successfully',
+        'report_date': str(report_day),
+        'report_location': f"s3://{S3_BUCKET}/{report_key}",
+        'rows': row_count,
+        'parts': len(writer.parts)
+    }
+
+
+# =====================================================
+# WAREHOUSE EXPORT (PARQUET)
+# =====================================================
+# Appends orders and order_items created since the last export as Parquet
+# files partitioned by order date:
+#   warehouse/<table>/order_date=YYYY-MM-DD/part-<from>.parquet
+# The created_at watermark lives in job_watermarks and only moves after
+# every file of the run is uploaded. Rows newer than now - lag are left
+# for the next run, so orders still committing are not skipped. Keys only
+# depend on the lower watermark: a failed run deletes what it uploaded,
+# and a retry starts from the same watermark and overwrites the same keys.
+
+WAREHOUSE_PREFIX = os.environ.get('WAREHOUSE_PREFIX', 'warehouse')
+WAREHOUSE_EXPORT_LAG_SECONDS = int(os.environ.get('WAREHOUSE_EXPORT_LAG_SECONDS', 300))
+WAREHOUSE_ROW_GROUP_SIZE = int(os.environ.get('WAREHOUSE_ROW_GROUP_SIZE', 50000))
+WAREHOUSE_JOB_NAME = 'warehouse_export'
+
+WAREHOUSE_QUERIES = {
+    'orders': """
+        SELECT o.order_id, o.customer_id, o.total_amount, o.status, o.created_at, o.updated_at
+        FROM orders o
+        WHERE o.created_at > %s AND o.created_at <= %s
+        ORDER BY o.created_at, o.order_id
+    """,
+    'order_items': """
+        SELECT oi.order_id, oi.product_id, oi.quantity, oi.price, oi.created_at
+        FROM order_items oi
+        WHERE oi.created_at > %s AND oi.created_at <= %s
+        ORDER BY oi.created_at, oi.order_id, oi.product_id
+    """,
+}
+
+
+def warehouse_schemas(pa):
+    return {
+        'orders': pa.schema([
+            ('order_id', pa.string()),
+            ('customer_id', pa.string()),
+            ('total_amount', pa.decimal128(10, 2)),
+            ('status', pa.string()),
+            ('created_at', pa.timestamp('us')),
+            ('updated_at', pa.timestamp('us')),
+        ]),
+        'order_items': pa.schema([
+            ('order_id', pa.string()),
+            ('product_id', pa.string()),
+            ('quantity', pa.int32()),
+            ('price', pa.decimal128(10, 2)),
+            ('created_at', pa.timestamp('us')),
+        ]),
+    }
+
+
+def export_table(conn, pa, pq, table, schema, lower, upper, keys):
+    """
+    Stream one table's new rows into one Parquet file per order date.
+    Rows arrive sorted by created_at, so only one file is open at a time.
+    Uploaded S3 keys are appended to keys as they land. Returns row_count.
+    """
+    created_at_index = schema.names.index('created_at')
+    run_tag = f"{lower:%Y%m%dT%H%M%S%f}" if lower.year > 1 else "initial"
+    row_count = 0
+    current = {'day': None, 'writer': None, 'path': None}
+    
+    def close_current():
+        if current['writer'] is None:
+            return
+        current['writer'].close()
+        key = f"{WAREHOUSE_PREFIX}/{table}/order_date={current['day']}/part-{run_tag}.parquet"
+        s3_client.upload_file(current['path'], S3_BUCKET, key)
+        keys.append(key)
+        os.remove(current['path'])
+        current.update(day=None, writer=None, path=None)
+    
+    cur = conn.cursor(name=f"warehouse_{table}")
+    cur.itersize = WAREHOUSE_ROW_GROUP_SIZE
+    try:
+        cur.execute(WAREHOUSE_QUERIES[table], (lower, upper))
+        while True:
+            rows = cur.fetchmany(WAREHOUSE_ROW_GROUP_SIZE)
+            if not rows:
+                break
+            row_count += len(rows)
+            
+            start = 0
+            while start < len(rows):
+                day = rows[start][created_at_index].date()
+                end = start
+                while end < len(rows) and rows[end][created_at_index].date() == day:
+                    end += 1
+                
+                if day != current['day']:
+                    close_current()
+                    current['day'] = day
+                    current['path'] = f"/tmp/{table}-{day}.parquet"
+                    current['writer'] = pq.ParquetWriter(current['path'], schema, compression='snappy')
+                
+                chunk = rows[start:end]
+                current['writer'].write_table(pa.Table.from_arrays(
+                    [pa.array([row[i] for row in chunk], type=field.type) for i, field in enumerate(schema)],
+                    schema=schema
+                ))
+                start = end
+        close_current()
+    finally:
+        if current['writer'] is not None:
+            current['writer'].close()
+            os.remove(current['path'])
+        cur.close()
+    
+    return row_count
+
+
+def delete_uploaded(keys):
+    """Remove the files of a failed export run (1000 keys per request)."""
+    for start in range(0, len(keys), 1000):
+        try:
+            s3_client.delete_objects(
+                Bucket=S3_BUCKET,
+                Delete={'Objects': [{'Key': key} for key in keys[start:start + 1000]], 'Quiet': True}
+            )
+        except Exception as e:
+            print(f"Could not delete partial export files: {str(e)}")
+
+
+def export_warehouse(event):
+    """
+    {"mode": "export"}
+    Append orders / order_items created since the last export to the
+    Parquet warehouse and advance the watermark.
+    """
+    # pyarrow hanya dibutuhkan mode export, jangan bebani cold start report
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    schemas = warehouse_schemas(pa)
+    conn = get_db_connection()
+    cur = conn.cursor()
+    files = []
+    try:
+        # Lock watermark: export yang tumpang tindih menunggu, bukan dobel
+        cur.execute("""
+            INSERT INTO job_watermarks (job_name, watermark)
+            VALUES (%s, '-infinity')
+            ON CONFLICT (job_name) DO NOTHING
+        """, (WAREHOUSE_JOB_NAME,))
+        cur.execute(
+            "SELECT watermark, now()::timestamp - make_interval(secs => %s) FROM job_watermarks WHERE job_name = %s FOR UPDATE",
+            (WAREHOUSE_EXPORT_LAG_SECONDS, WAREHOUSE_JOB_NAME)
+        )
+        lower, upper = cur.fetchone()
         
-        df_summary = pd.read_sql_query(query, conn, params=(start_date,))
+        if upper <= lower:
+            conn.rollback()
+            return {'status': 'success', 'message': 'Warehouse is up to date', 'watermark': lower.isoformat()}
+        
+        exported = {}
+        for table in ('orders', 'order_items'):
+            exported[table] = export_table(conn, pa, pq, table, schemas[table], lower, upper, files)
+        
+        cur.execute(
+            "UPDATE job_watermarks SET watermark = %s, updated_at = now() WHERE job_name = %s",
+            (upper, WAREHOUSE_JOB_NAME)
+        )
+        conn.commit()
+        
+        print(f"Warehouse export up to {upper}: {exported}, {len(files)} files")
+        return {
+            'status': 'success',
+            'message': 'Warehouse export finished',
+            'from': lower.isoformat() if lower.year > 1 else None,
+            'to': upper.isoformat(),
+            'rows': exported,
+            'files': [f"s3://{S3_BUCKET}/{key}" for key in files]
+        }
+    except Exception:
+        conn.rollback()
+        # Watermark tidak maju: buang file run ini supaya tidak ada duplikat
+        delete_uploaded(files)
+        raise
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+
+# =====================================================
+# DAILY SUMMARY QUERIES
+# =====================================================
+# Triggers on orders / order_items append deltas to *_rollup_delta (see
+# init_database); fold_daily_rollups() moves them into daily_order_rollup /
+# daily_product_rollup. The report folds first (on the primary) and reads
+# rollup + not yet folded deltas, so it is exact even when the fold
+# fails or the replica lags. The direct queries use half-open created_at
+# ranges, which prune the monthly orders / order_items partitions
+# (order_items.created_at is the order's created_at); they are the
+# fallback for databases that were initialized before the rollups existed.
+
+ROLLUP_SUMMARY_QUERY = """
+    SELECT day, status, SUM(order_count) AS order_count, SUM(total_revenue) AS total_revenue
+    FROM (
+        SELECT day, status, order_count, total_revenue
+        FROM daily_order_rollup
+        WHERE day >= %(start)s AND day < %(end)s
+        UNION ALL
+        SELECT day, status, order_count, total_revenue
+        FROM daily_order_rollup_delta
+        WHERE day >= %(start)s AND day < %(end)s
+    ) r
+    GROUP BY day, status
+    HAVING SUM(order_count) <> 0
+    ORDER BY day, status
+"""
+
+ROLLUP_PRODUCTS_QUERY = """
+    SELECT day, product_name, total_quantity, total_revenue
+    FROM (
+        SELECT
+            r.day,
+            COALESCE(i.product_name, r.product_id) AS product_name,
+            r.total_quantity,
+            r.total_revenue,
+            ROW_NUMBER() OVER (PARTITION BY r.day ORDER BY r.total_revenue DESC) AS product_rank
+        FROM (
+            SELECT day, product_id, SUM(total_quantity) AS total_quantity, SUM(total_revenue) AS total_revenue
+            FROM (
+                SELECT day, product_id, total_quantity, total_revenue
+                FROM daily_product_rollup
+                WHERE day >= %(start)s AND day < %(end)s
+                UNION ALL
+                SELECT day, product_id, total_quantity, total_revenue
+                FROM daily_product_rollup_delta
+                WHERE day >= %(start)s AND day < %(end)s
+            ) u
+            GROUP BY day, product_id
+            HAVING SUM(total_quantity) <> 0
+        ) r
+        LEFT JOIN inventory i ON i.product_id = r.product_id
+    ) ranked
+    WHERE product_rank <= 10
+    ORDER BY day, product_rank
+"""
+
+RANGE_SUMMARY_QUERY = """
+    SELECT 
+        date_trunc('day', o.created_at)::date as day,
+        o.status,
+        COUNT(*) as order_count,
+        SUM(o.total_amount) as total_revenue
+    FROM orders o
+    WHERE o.created_at >= %s AND o.created_at < %s
+    GROUP BY date_trunc('day', o.created_at), o.status
+    ORDER BY 1, 2
+"""
+
+RANGE_PRODUCTS_QUERY = """
+    SELECT day, product_name, total_quantity, total_revenue
+    FROM (
+        SELECT 
+            date_trunc('day', oi.created_at)::date as day,
+            i.product_name,
+            SUM(oi.quantity) as total_quantity,
+            SUM(oi.quantity * oi.price) as total_revenue,
+            ROW_NUMBER() OVER (
+                PARTITION BY date_trunc('day', oi.created_at)
+                ORDER BY SUM(oi.quantity * oi.price) DESC
+            ) as product_rank
+        FROM order_items oi
+        JOIN inventory i ON oi.product_id = i.product_id
+        WHERE oi.created_at >= %s AND oi.created_at < %s
+        GROUP BY date_trunc('day', oi.created_at), i.product_name
+    ) ranked
+    WHERE product_rank <= 10
+    ORDER BY day, product_rank
+"""
+
+INVENTORY_STATUS_QUERY = """
+    SELECT 
+        product_name,
+        stock_quantity,
+        stock_status
+    FROM inventory_available
+    ORDER BY stock_quantity ASC
+    LIMIT 20
+"""
+
+
+def elapsed_ms(started):
+    return round((time.perf_counter() - started) * 1000, 1)
+
+
+def read_frame(name, attempts):
+    """
+    Run one report query on its own pooled connection. attempts is a list
+    of (sql, params); later entries are fallbacks for the earlier ones
+    (rollup table missing -> direct query). Returns (frame, elapsed_ms).
+    """
+    started = time.perf_counter()
+    conn = get_db_connection(readonly=True)
+    try:
+        for index, (sql, params) in enumerate(attempts):
+            try:
+                return pd.read_sql_query(sql, conn, params=params), elapsed_ms(started)
+            except (psycopg2.Error, pd.errors.DatabaseError) as e:
+                if index == len(attempts) - 1:
+                    raise
+                print(f"{name}: rollup tables unavailable, querying orders directly: {str(e)}")
+                conn.rollback()
+    finally:
+        release_db_connection(conn)
+
+
+def fold_rollups():
+    """
+    Fold pending rollup deltas on the primary. Best effort: the report
+    queries also read unfolded deltas.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        cur.execute("SELECT fold_daily_rollups()")
+        folded = cur.fetchone()[0]
+        conn.commit()
+        return folded
+    except psycopg2.Error as e:
+        conn.rollback()
+        print(f"Rollup fold skipped: {str(e)}")
+        return None
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+
+def read_report_frames(first_day, last_day):
+    """
+    df_summary / df_products for every day in [first_day, last_day] (one
+    grouped pass each, with a `day` column) and df_inventory. The three
+    queries are independent and run concurrently on separate connections.
+    Returns (frames, timings).
+    """
+    end_day = last_day + timedelta(days=1)
+    start_ts = datetime.combine(first_day, datetime.min.time())
+    end_ts = datetime.combine(end_day, datetime.min.time())
+    
+    queries = {
+        'summary': [
+            (ROLLUP_SUMMARY_QUERY, {'start': first_day, 'end': end_day}),
+            (RANGE_SUMMARY_QUERY, (start_ts, end_ts))
+        ],
+        'products': [
+            (ROLLUP_PRODUCTS_QUERY, {'start': first_day, 'end': end_day}),
+            (RANGE_PRODUCTS_QUERY, (start_ts, end_ts))
+        ],
+        # Inventory status (view inventory_available: stok termasuk penjualan shard hot SKU)
+        'inventory': [
+            (INVENTORY_STATUS_QUERY, None)
+        ]
+    }
+    
+    with ThreadPoolExecutor(max_workers=len(queries)) as executor:
+        futures = {name: executor.submit(read_frame, name, attempts) for name, attempts in queries.items()}
+        results = {name: future.result() for name, future in futures.items()}
+    
+    frames = {name: frame for name, (frame, _) in results.items()}
+    timings = {f"{name}_query_ms": ms for name, (_, ms) in results.items()}
+    return frames, timings
+
+
+def split_by_day(df):
+    """{day: frame without the day column}, plus an empty frame for missing days."""
+    frames = {day: frame.drop(columns='day').reset_index(drop=True) for day, frame in df.groupby('day')}
+    return frames, df.iloc[0:0].drop(columns='day')
+
+
+def publish_day_report(day, df_summary, df_products, df_inventory):
+    """
+    Build and upload the workbook and JSON summary for one day. The JSON
+    upload runs while the workbook is being built and uploaded.
+    """
+    summary = {
+        'report_date': str(day),
+        'total_orders': int(df_summary['order_count'].sum()),
+        'total_revenue': float(df_summary['total_revenue'].sum()),
+        'orders_by_status': df_summary.to_dict('records'),
+        'top_products': df_products.head(5).to_dict('records'),
+        'low_stock_items': df_inventory[df_inventory['stock_status'] != 'Normal'].to_dict('records')
+    }
+    
+    report_key = f"reports/daily-report-{day}.xlsx"
+    summary_key = f"reports/daily-summary-{day}.json"
+    
+    with ThreadPoolExecutor(max_workers=1) as uploads:
+        started = time.perf_counter()
+        summary_upload = uploads.submit(
+            s3_client.put_object,
+            Bucket=S3_BUCKET,
+            Key=summary_key,
+            Body=json.dumps(summary, indent=2),
+            ContentType='application/json'
+        )
         
-        # Top products
-        query = """
-            SELECT 
-                i.product_name,
-                SUM(oi.quantity) as total_quantity,
-                SUM(oi.quantity * oi.price) as total_revenue
-            FROM order_items oi
-            JOIN orders o ON oi.order_id = o.order_id
-            JOIN inventory i ON oi.product_id = i.product_id
-            WHERE DATE(o.order_date) = %s
-            GROUP BY i.product_name
-            ORDER BY total_revenue DESC
-            LIMIT 10
-        """
-        
-        df_products = pd.read_sql_query(query, conn, params=(start_date,))
-        
-        # Inventory status
-        query = """
-            SELECT 
-                product_name,
-                stock_quantity,
-                CASE 
-                    WHEN stock_quantity < 10 THEN 'Critical'
-                    WHEN stock_quantity < 50 THEN 'Low'
-                    ELSE 'Normal'
-                END as stock_status
-            FROM inventory
-            ORDER BY stock_quantity ASC
-            LIMIT 20
-        """
-        
-        df_inventory = pd.read_sql_query(query, conn)
-        
-        conn.close()
-        
-        # Create Excel report
         output = BytesIO()
         with pd.ExcelWriter(output, engine='openpyxl') as writer:
             df_summary.to_excel(writer, sheet_name='Daily Summary', index=False)
             df_products.to_excel(writer, sheet_name='Top Products', index=False)
             df_inventory.to_excel(writer, sheet_name='Inventory Status', index=False)
+        workbook_ms = elapsed_ms(started)
         
-        output.seek(0)
-        
-        # Upload to S3
-        report_key = f"reports/daily-report-{start_date}.xlsx"
+        built = time.perf_counter()
         s3_client.put_object(
             Bucket=S3_BUCKET,
             Key=report_key,
             Body=output.getvalue(),
             ContentType='application/vnd.openxmlformats-officedocument.spreadsheetml.sheet'
         )
+        summary_upload.result()
+        upload_ms = elapsed_ms(built)
+    
+    return {
+        'report_date': str(day),
+        'report_location': f"s3://{S3_BUCKET}/{report_key}",
+        'summary': summary,
+        'timings': {'workbook_ms': workbook_ms, 'upload_ms': upload_ms}
+    }
+
+
+def parse_report_range(event, default_day):
+    """
+    (first_day, last_day) from start_date / end_date (inclusive, YYYY-MM-DD).
+    """
+    start = event.get('start_date')
+    end = event.get('end_date') or start
+    if not start:
+        return default_day, default_day
+    
+    first_day = datetime.strptime(start, '%Y-%m-%d').date()
+    last_day = datetime.strptime(end, '%Y-%m-%d').date()
+    if last_day < first_day:
+        raise ValueError('end_date must not be before start_date')
+    if (last_day - first_day).days + 1 > REPORT_MAX_DAYS:
+        raise ValueError(f'Date range is limited to {REPORT_MAX_DAYS} days')
+    return first_day, last_day
+
+
+def lambda_handler(event, context):
+    """
+    Generate daily order report(s). Without start_date / end_date the
+    report covers yesterday.
+    """
+    try:
+        event = event or {}
+        report_date = datetime.now().date()
+        start_date = report_date - timedelta(days=1)
         
-        # Create JSON summary
-        summary = {
-            'report_date': str(start_date),
-            'total_orders': int(df_summary['order_count'].sum()),
-            'total_revenue': float(df_summary['total_revenue'].sum()),
-            'orders_by_status': df_summary.to_dict('records'),
-            'top_products': df_products.head(5).to_dict('records'),
-            'low_stock_items': df_inventory[df_inventory['stock_status'] != 'Normal'].to_dict('records')
-        }
+        if event.get('mode') == 'export':
+            return export_warehouse(event)
         
-        # Save JSON summary
-        summary_key = f"reports/daily-summary-{start_date}.json"
-        s3_client.put_object(
-            Bucket=S3_BUCKET,
-            Key=summary_key,
-            Body=json.dumps(summary, indent=2),
-            ContentType='application/json'
-        )
+        if event.get('mode') == 'stream':
+            report_day = datetime.strptime(event['date'], '%Y-%m-%d').date() if event.get('date') else start_date
+            return generate_detail_report(report_day, event.get('format', 'xlsx'))
+        
+        try:
+            first_day, last_day = parse_report_range(event, start_date)
+        except ValueError as e:
+            return {
+                'status': 'error',
+                'message': f'Invalid date range: {str(e)}'
+            }
+        
+        started = time.perf_counter()
+        fold_rollups()
+        fold_ms = elapsed_ms(started)
+        
+        # Satu pass per query untuk seluruh rentang, ketiganya paralel
+        frames, timings = read_report_frames(first_day, last_day)
+        timings['fold_ms'] = fold_ms
+        timings['queries_ms'] = elapsed_ms(started)
+        
+        summaries, empty_summary = split_by_day(frames['summary'])
+        products, empty_products = split_by_day(frames['products'])
+        days = [first_day + timedelta(days=offset) for offset in range((last_day - first_day).days + 1)]
+        
+        # Workbook + upload per hari, paralel tapi dibatasi
+        publish_started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=min(REPORT_UPLOAD_CONCURRENCY, len(days))) as executor:
+            reports = list(executor.map(
+                lambda day: publish_day_report(
+                    day,
+                    summaries.get(day, empty_summary),
+                    products.get(day, empty_products),
+                    frames['inventory']
+                ),
+                days
+            ))
+        timings['publish_ms'] = elapsed_ms(publish_started)
+        
+        # Untuk rentang: total waktu semua hari (bukan wall clock)
+        timings['workbook_ms'] = round(sum(report['timings']['workbook_ms'] for report in reports), 1)
+        timings['upload_ms'] = round(sum(report['timings']['upload_ms'] for report in reports), 1)
+        timings['total_ms'] = elapsed_ms(started)
+        print(f"Report timings: {json.dumps(timings)}")
+        
+        if len(reports) == 1:
+            return {
+                'status': 'success',
+                'message': 'Report generated successfully',
+                'report_date': reports[0]['report_date'],
+                'report_location': reports[0]['report_location'],
+                'summary': reports[0]['summary'],
+                'timings': timings
+            }
         
         return {
             'status': 'success',
-            'message': 'Report generated successfully',
-            'report_date': str(start_date),
-            'report_location': f"s3://{S3_BUCKET}/{report_key}",
-            'summary': summary
+            'message': f'{len(reports)} reports generated successfully',
+            'start_date': str(first_day),
+            'end_date': str(last_day),
+            'reports': [
+                {
+                    'report_date': report['report_date'],
+                    'report_location': report['report_location'],
+                    'total_orders': report['summary']['total_orders'],
+                    'total_revenue': report['summary']['total_revenue']
+                }
+                for report in reports
+            ],
+            'timings': timings
         }
         
     except Exception as e:
@@ -131,4 +805,4 @@ def lambda_handler(event, context):
         return {
             'status': 'error',
             'message': f'Report generation failed: {str(e)}'
-        }
\ No newline at end of file
+        }
@@ -1,32 +1,1099 @@
+import hashlib
+import io
 import json
 import os
-import psycopg2
-from datetime import datetime
+import random
+import time
+from datetime import datetime, timedelta
 import traceback
 
-# ==============================
-# ENV VARIABLES
-# ==============================
-DB_HOST = os.environ.get("DB_HOST")
-DB_NAME = os.environ.get("DB_NAME")
-DB_USER = os.environ.get("DB_USER")
-DB_PASSWORD = os.environ.get("DB_PASSWORD")
+from db_layer import get_db_connection, release_db_connection
 
+# Partisi bulanan orders / order_items (migration 15)
+PARTITION_PREMAKE_MONTHS = int(os.environ.get('PARTITION_PREMAKE_MONTHS', 3))
+# 0 = partisi lama tidak pernah diarsipkan
+PARTITION_RETAIN_MONTHS = int(os.environ.get('PARTITION_RETAIN_MONTHS', 0))
+# CREATE / DETACH PARTITION butuh lock eksklusif di parent; jangan antri lama
+# di belakang query report yang panjang
+PARTITION_LOCK_TIMEOUT_MS = int(os.environ.get('PARTITION_LOCK_TIMEOUT_MS', 5000))
 
-def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+# =====================================================
+# MIGRATIONS
+# =====================================================
+# Ordered schema changes, each applied once and recorded with its checksum
+# in schema_migrations. Never edit an applied migration: add a new one.
+# Entries with 'indexes' run CREATE INDEX CONCURRENTLY outside a
+# transaction, so live orders / inventory traffic is not blocked.
+# Runtime code reads the applied version through db_layer.get_schema_version.
+# Configuration reaches migration SQL as session settings (app.<name>, see
+# apply_migrations), so the checksummed text does not change with it.
+# Entries marked 'blocking' rewrite big tables under ACCESS EXCLUSIVE locks;
+# they are only applied when the run allows it (allow_blocking_migrations).
+MIGRATIONS = [
+    {
+        'version': 1,
+        'name': 'base_tables',
+        'sql': """
+        CREATE TABLE IF NOT EXISTS customers (
+            customer_id VARCHAR(50) PRIMARY KEY,
+            customer_name VARCHAR(100) NOT NULL,
+            email VARCHAR(100) UNIQUE NOT NULL,
+            phone VARCHAR(20),
+            address TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS inventory (
+            product_id VARCHAR(50) PRIMARY KEY,
+            product_name VARCHAR(100) NOT NULL,
+            description TEXT,
+            price DECIMAL(10,2) NOT NULL CHECK (price >= 0),
+            stock_quantity INTEGER NOT NULL DEFAULT 0 CHECK (stock_quantity >= 0),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS orders (
+            order_id VARCHAR(50) PRIMARY KEY,
+            customer_id VARCHAR(50) NOT NULL,
+            total_amount DECIMAL(10,2) NOT NULL CHECK (total_amount >= 0),
+            status VARCHAR(50) DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (customer_id)
+                REFERENCES customers(customer_id)
+                ON DELETE CASCADE
+        );
+
+        CREATE TABLE IF NOT EXISTS order_items (
+            id SERIAL PRIMARY KEY,
+            order_id VARCHAR(50) NOT NULL,
+            product_id VARCHAR(50) NOT NULL,
+            quantity INTEGER NOT NULL CHECK (quantity > 0),
+            price DECIMAL(10,2) NOT NULL CHECK (price >= 0),
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (order_id)
+                REFERENCES orders(order_id)
+                ON DELETE CASCADE,
+            FOREIGN KEY (product_id)
+                REFERENCES inventory(product_id)
+                ON DELETE CASCADE
+        );
+        """
+    },
+    # Kolom yang dulu ditambahkan lewat ALTER terpisah
+    {
+        'version': 2,
+        'name': 'baseline_columns',
+        'sql': """
+        ALTER TABLE customers ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+        ALTER TABLE customers ADD COLUMN IF NOT EXISTS phone VARCHAR(20);
+        ALTER TABLE customers ADD COLUMN IF NOT EXISTS address TEXT;
+        ALTER TABLE inventory ADD COLUMN IF NOT EXISTS description TEXT;
+        ALTER TABLE inventory ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+        ALTER TABLE inventory ADD COLUMN IF NOT EXISTS category VARCHAR(50);
+        ALTER TABLE orders ADD COLUMN IF NOT EXISTS updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
+        ALTER TABLE orders ADD COLUMN IF NOT EXISTS payment_status VARCHAR(50);
+        ALTER TABLE orders ADD COLUMN IF NOT EXISTS transaction_id VARCHAR(100);
+        """
+    },
+    {
+        'version': 3,
+        'name': 'baseline_indexes',
+        'indexes': [
+            ('idx_orders_customer_id', "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_customer_id ON orders(customer_id)"),
+            ('idx_inventory_category', "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_category ON inventory(category)"),
+            ('idx_customers_email', "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_customers_email ON customers(email)"),
+        ]
+    },
+    # order_id -> execution ARN dan cache status Step Functions
+    {
+        'version': 4,
+        'name': 'order_workflow_tables',
+        'sql': """
+        CREATE TABLE IF NOT EXISTS order_executions (
+            order_id VARCHAR(50) PRIMARY KEY,
+            execution_arn VARCHAR(2048) NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            FOREIGN KEY (order_id)
+                REFERENCES orders(order_id)
+                ON DELETE CASCADE
+        );
+
+        CREATE TABLE IF NOT EXISTS workflow_status_cache (
+            execution_arn VARCHAR(2048) PRIMARY KEY,
+            status VARCHAR(20) NOT NULL,
+            result JSONB NOT NULL,
+            is_terminal BOOLEAN NOT NULL DEFAULT FALSE,
+            fetched_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    },
+    # Keyset pagination list_orders dan range query report
+    {
+        'version': 5,
+        'name': 'orders_created_at_index',
+        'indexes': [
+            ('idx_orders_created_at_order_id', "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_orders_created_at_order_id ON orders(created_at DESC, order_id DESC)"),
+        ]
+    },
+    # Hot SKU mode: stok product populer dipecah ke beberapa shard
+    {
+        'version': 6,
+        'name': 'hot_sku_shards',
+        'sql': """
+        CREATE TABLE IF NOT EXISTS inventory_stock_shards (
+            product_id VARCHAR(50) NOT NULL,
+            shard_no SMALLINT NOT NULL,
+            quantity INTEGER NOT NULL DEFAULT 0 CHECK (quantity >= 0),
+            sold INTEGER NOT NULL DEFAULT 0 CHECK (sold >= 0),
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (product_id, shard_no),
+            FOREIGN KEY (product_id)
+                REFERENCES inventory(product_id)
+                ON DELETE CASCADE
+        );
+        """
+    },
+    # Dedup low stock event per product
+    {
+        'version': 7,
+        'name': 'low_stock_alert_log',
+        'sql': """
+        CREATE TABLE IF NOT EXISTS low_stock_alert_log (
+            product_id VARCHAR(50) PRIMARY KEY,
+            last_sent_at TIMESTAMP NOT NULL
+        );
+        """
+    },
+    # Versi cache catalog (list_products), di-bump setelah stok berubah
+    {
+        'version': 8,
+        'name': 'catalog_version_seq',
+        'sql': """
+        CREATE SEQUENCE IF NOT EXISTS catalog_version_seq;
+        """
+    },
+    # Idempotency update_inventory: satu baris per order yang sudah diterapkan
+    {
+        'version': 9,
+        'name': 'inventory_applied_orders',
+        'sql': """
+        CREATE TABLE IF NOT EXISTS inventory_applied_orders (
+            order_id VARCHAR(50) PRIMARY KEY,
+            result JSONB,
+            applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+        """
+    },
+    # detects_lowstock: watermark, state digest, threshold per product. Trigger
+    # menjaga updated_at tetap bergerak untuk penulis yang tidak mengisinya.
+    {
+        'version': 10,
+        'name': 'low_stock_detector',
+        'sql': """
+        CREATE TABLE IF NOT EXISTS job_watermarks (
+            job_name VARCHAR(50) PRIMARY KEY,
+            watermark TIMESTAMP NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        );
+
+        CREATE TABLE IF NOT EXISTS low_stock_digest_state (
+            product_id VARCHAR(50) PRIMARY KEY,
+            alerted_stock INTEGER NOT NULL,
+            alerted_at TIMESTAMP NOT NULL
+        );
+
+        ALTER TABLE inventory ADD COLUMN IF NOT EXISTS alert_threshold INTEGER NOT NULL DEFAULT 10;
+
+        CREATE OR REPLACE FUNCTION inventory_touch_updated_at() RETURNS trigger AS $$
+        BEGIN
+            IF NEW.updated_at IS NOT DISTINCT FROM OLD.updated_at THEN
+                NEW.updated_at := now();
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_inventory_touch_updated_at ON inventory;
+        CREATE TRIGGER trg_inventory_touch_updated_at
+        BEFORE UPDATE OF stock_quantity, alert_threshold ON inventory
+        FOR EACH ROW EXECUTE FUNCTION inventory_touch_updated_at();
+        """
+    },
+    # Hanya baris low stock, dipakai detects_lowstock (watermark updated_at)
+    {
+        'version': 11,
+        'name': 'low_stock_partial_index',
+        'indexes': [
+            ('idx_inventory_low_stock', "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_low_stock ON inventory(updated_at) WHERE stock_quantity <= alert_threshold"),
+        ]
+    },
+    # Threshold per product / category / default, disalin trigger ke inventory
+    # (alert_threshold, low_threshold) dan stock_status (generated column)
+    {
+        'version': 12,
+        'name': 'stock_thresholds',
+        'sql': """
+        CREATE TABLE IF NOT EXISTS stock_thresholds (
+            scope VARCHAR(10) NOT NULL CHECK (scope IN ('product', 'category', 'default')),
+            scope_key VARCHAR(50) NOT NULL,
+            alert_threshold INTEGER NOT NULL CHECK (alert_threshold >= 0),
+            low_threshold INTEGER NOT NULL,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (scope, scope_key),
+            CHECK (low_threshold >= alert_threshold)
+        );
+
+        INSERT INTO stock_thresholds (scope, scope_key, alert_threshold, low_threshold)
+        VALUES ('default', '*', 10, 50)
+        ON CONFLICT (scope, scope_key) DO NOTHING;
+
+        CREATE SEQUENCE IF NOT EXISTS stock_thresholds_version_seq;
+
+        ALTER TABLE inventory ADD COLUMN IF NOT EXISTS low_threshold INTEGER NOT NULL DEFAULT 50;
+        ALTER TABLE inventory ADD COLUMN IF NOT EXISTS stock_status VARCHAR(10) GENERATED ALWAYS AS (
+            CASE
+                WHEN stock_quantity <= alert_threshold THEN 'Critical'
+                WHEN stock_quantity <= low_threshold THEN 'Low'
+                ELSE 'Normal'
+            END
+        ) STORED;
+
+        CREATE OR REPLACE FUNCTION resolve_stock_thresholds(p_product_id VARCHAR, p_category VARCHAR)
+        RETURNS TABLE (alert_threshold INTEGER, low_threshold INTEGER) AS $$
+            SELECT t.alert_threshold, t.low_threshold
+            FROM stock_thresholds t
+            WHERE (t.scope = 'product' AND t.scope_key = p_product_id)
+               OR (t.scope = 'category' AND t.scope_key = p_category)
+               OR t.scope = 'default'
+            ORDER BY CASE t.scope WHEN 'product' THEN 0 WHEN 'category' THEN 1 ELSE 2 END
+            LIMIT 1;
+        $$ LANGUAGE sql STABLE;
+
+        CREATE OR REPLACE FUNCTION inventory_apply_stock_thresholds() RETURNS trigger AS $$
+        DECLARE
+            t RECORD;
+        BEGIN
+            SELECT * INTO t FROM resolve_stock_thresholds(NEW.product_id, NEW.category);
+            IF FOUND THEN
+                NEW.alert_threshold := t.alert_threshold;
+                NEW.low_threshold := t.low_threshold;
+            END IF;
+            RETURN NEW;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_inventory_apply_stock_thresholds ON inventory;
+        CREATE TRIGGER trg_inventory_apply_stock_thresholds
+        BEFORE INSERT OR UPDATE OF product_id, category ON inventory
+        FOR EACH ROW EXECUTE FUNCTION inventory_apply_stock_thresholds();
+
+        CREATE OR REPLACE FUNCTION sync_inventory_stock_thresholds() RETURNS void AS $$
+            UPDATE inventory i
+            SET alert_threshold = t.alert_threshold,
+                low_threshold = t.low_threshold
+            FROM inventory src
+            CROSS JOIN LATERAL resolve_stock_thresholds(src.product_id, src.category) t
+            WHERE src.product_id = i.product_id
+            AND (i.alert_threshold, i.low_threshold) IS DISTINCT FROM (t.alert_threshold, t.low_threshold);
+        $$ LANGUAGE sql;
+
+        CREATE OR REPLACE FUNCTION stock_thresholds_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM sync_inventory_stock_thresholds();
+            PERFORM nextval('stock_thresholds_version_seq');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_stock_thresholds_changed ON stock_thresholds;
+        CREATE TRIGGER trg_stock_thresholds_changed
+        AFTER INSERT OR UPDATE OR DELETE ON stock_thresholds
+        FOR EACH STATEMENT EXECUTE FUNCTION stock_thresholds_changed();
+
+        SELECT sync_inventory_stock_thresholds();
+        """
+    },
+    {
+        'version': 13,
+        'name': 'stock_status_index',
+        'indexes': [
+            ('idx_inventory_stock_status', "CREATE INDEX CONCURRENTLY IF NOT EXISTS idx_inventory_stock_status ON inventory(stock_status, stock_quantity)"),
+        ]
+    },
+    # Rollup harian untuk generate_report. Trigger per statement (transition
+    # table), jadi insert batch cukup satu upsert per (day, status) / (day, product).
+    {
+        'version': 14,
+        'name': 'daily_rollups',
+        'sql': """
+        CREATE TABLE IF NOT EXISTS daily_order_rollup (
+            day DATE NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            order_count INTEGER NOT NULL DEFAULT 0,
+            total_revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, status)
+        );
+
+        CREATE TABLE IF NOT EXISTS daily_product_rollup (
+            day DATE NOT NULL,
+            product_id VARCHAR(50) NOT NULL,
+            total_quantity INTEGER NOT NULL DEFAULT 0,
+            total_revenue DECIMAL(14,2) NOT NULL DEFAULT 0,
+            PRIMARY KEY (day, product_id)
+        );
+
+        CREATE OR REPLACE FUNCTION orders_rollup_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO daily_order_rollup AS r (day, status, order_count, total_revenue)
+                SELECT created_at::date, COALESCE(status, 'unknown'), COUNT(*), COALESCE(SUM(total_amount), 0)
+                FROM new_rows
+                GROUP BY 1, 2
+                ON CONFLICT (day, status) DO UPDATE
+                SET order_count = r.order_count + EXCLUDED.order_count,
+                    total_revenue = r.total_revenue + EXCLUDED.total_revenue;
+            ELSIF TG_OP = 'UPDATE' THEN
+                INSERT INTO daily_order_rollup AS r (day, status, order_count, total_revenue)
+                SELECT day, status, SUM(order_count), SUM(total_revenue)
+                FROM (
+                    SELECT o.created_at::date AS day, COALESCE(o.status, 'unknown') AS status,
+                           -1 AS order_count, -o.total_amount AS total_revenue
+                    FROM old_rows o JOIN new_rows n ON n.order_id = o.order_id
+                    WHERE (o.status, o.total_amount, o.created_at) IS DISTINCT FROM (n.status, n.total_amount, n.created_at)
+                    UNION ALL
+                    SELECT n.created_at::date, COALESCE(n.status, 'unknown'), 1, n.total_amount
+                    FROM old_rows o JOIN new_rows n ON n.order_id = o.order_id
+                    WHERE (o.status, o.total_amount, o.created_at) IS DISTINCT FROM (n.status, n.total_amount, n.created_at)
+                ) delta
+                GROUP BY day, status
+                ON CONFLICT (day, status) DO UPDATE
+                SET order_count = r.order_count + EXCLUDED.order_count,
+                    total_revenue = r.total_revenue + EXCLUDED.total_revenue;
+            ELSE
+                INSERT INTO daily_order_rollup AS r (day, status, order_count, total_revenue)
+                SELECT created_at::date, COALESCE(status, 'unknown'), -COUNT(*), -COALESCE(SUM(total_amount), 0)
+                FROM old_rows
+                GROUP BY 1, 2
+                ON CONFLICT (day, status) DO UPDATE
+                SET order_count = r.order_count + EXCLUDED.order_count,
+                    total_revenue = r.total_revenue + EXCLUDED.total_revenue;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_orders_rollup_insert ON orders;
+        CREATE TRIGGER trg_orders_rollup_insert
+        AFTER INSERT ON orders REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_rollup_apply();
+
+        DROP TRIGGER IF EXISTS trg_orders_rollup_update ON orders;
+        CREATE TRIGGER trg_orders_rollup_update
+        AFTER UPDATE ON orders REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_rollup_apply();
+
+        DROP TRIGGER IF EXISTS trg_orders_rollup_delete ON orders;
+        CREATE TRIGGER trg_orders_rollup_delete
+        AFTER DELETE ON orders REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_rollup_apply();
+
+        -- Item dihitung di hari order-nya. Item yang ikut terhapus lewat
+        -- CASCADE tidak menemukan order lagi, jadi dikurangi di sini dulu.
+        CREATE OR REPLACE FUNCTION orders_rollup_remove_items() RETURNS trigger AS $$
+        BEGIN
+            INSERT INTO daily_product_rollup AS r (day, product_id, total_quantity, total_revenue)
+            SELECT OLD.created_at::date, product_id, -SUM(quantity), -SUM(quantity * price)
+            FROM order_items
+            WHERE order_id = OLD.order_id
+            GROUP BY product_id
+            ON CONFLICT (day, product_id) DO UPDATE
+            SET total_quantity = r.total_quantity + EXCLUDED.total_quantity,
+                total_revenue = r.total_revenue + EXCLUDED.total_revenue;
+            RETURN OLD;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_orders_rollup_remove_items ON orders;
+        CREATE TRIGGER trg_orders_rollup_remove_items
+        BEFORE DELETE ON orders
+        FOR EACH ROW EXECUTE FUNCTION orders_rollup_remove_items();
+
+        CREATE OR REPLACE FUNCTION order_items_rollup_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO daily_product_rollup AS r (day, product_id, total_quantity, total_revenue)
+                SELECT o.created_at::date, x.product_id, -SUM(x.quantity), -SUM(x.quantity * x.price)
+                FROM old_rows x JOIN orders o ON o.order_id = x.order_id
+                GROUP BY 1, 2
+                ON CONFLICT (day, product_id) DO UPDATE
+                SET total_quantity = r.total_quantity + EXCLUDED.total_quantity,
+                    total_revenue = r.total_revenue + EXCLUDED.total_revenue;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO daily_product_rollup AS r (day, product_id, total_quantity, total_revenue)
+                SELECT o.created_at::date, x.product_id, SUM(x.quantity), SUM(x.quantity * x.price)
+                FROM new_rows x JOIN orders o ON o.order_id = x.order_id
+                GROUP BY 1, 2
+                ON CONFLICT (day, product_id) DO UPDATE
+                SET total_quantity = r.total_quantity + EXCLUDED.total_quantity,
+                    total_revenue = r.total_revenue + EXCLUDED.total_revenue;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_order_items_rollup_insert ON order_items;
+        CREATE TRIGGER trg_order_items_rollup_insert
+        AFTER INSERT ON order_items REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION order_items_rollup_apply();
+
+        DROP TRIGGER IF EXISTS trg_order_items_rollup_update ON order_items;
+        CREATE TRIGGER trg_order_items_rollup_update
+        AFTER UPDATE ON order_items REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION order_items_rollup_apply();
+
+        DROP TRIGGER IF EXISTS trg_order_items_rollup_delete ON order_items;
+        CREATE TRIGGER trg_order_items_rollup_delete
+        AFTER DELETE ON order_items REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION order_items_rollup_apply();
+
+        -- Hitung ulang semua rollup dari orders / order_items
+        CREATE OR REPLACE FUNCTION rebuild_daily_rollups() RETURNS void AS $$
+            DELETE FROM daily_order_rollup;
+            INSERT INTO daily_order_rollup (day, status, order_count, total_revenue)
+            SELECT created_at::date, COALESCE(status, 'unknown'), COUNT(*), COALESCE(SUM(total_amount), 0)
+            FROM orders
+            GROUP BY 1, 2;
+            DELETE FROM daily_product_rollup;
+            INSERT INTO daily_product_rollup (day, product_id, total_quantity, total_revenue)
+            SELECT o.created_at::date, oi.product_id, SUM(oi.quantity), SUM(oi.quantity * oi.price)
+            FROM order_items oi JOIN orders o ON o.order_id = oi.order_id
+            GROUP BY 1, 2;
+        $$ LANGUAGE sql;
+
+        SELECT rebuild_daily_rollups();
+        """
+    },
+    # orders / order_items dipartisi per bulan created_at. order_items.created_at
+    # = created_at order-nya, jadi item selalu di partisi bulan yang sama dan
+    # FK (order_id, created_at) tetap bisa dipakai. Tabel lama disalin sekali
+    # lalu dibuang (satu transaksi, lock penuh: jalankan di maintenance window).
+    {
+        'version': 15,
+        'name': 'partition_orders_by_month',
+        'blocking': True,
+        'sql': """
+        -- PK orders jadi (order_id, created_at), FK ke order_id saja tidak mungkin lagi
+        ALTER TABLE order_executions DROP CONSTRAINT IF EXISTS order_executions_order_id_fkey;
+
+        ALTER TABLE order_items RENAME TO order_items_unpartitioned;
+        ALTER TABLE orders RENAME TO orders_unpartitioned;
+        ALTER INDEX order_items_pkey RENAME TO order_items_unpartitioned_pkey;
+        ALTER INDEX orders_pkey RENAME TO orders_unpartitioned_pkey;
+        DROP INDEX IF EXISTS idx_orders_customer_id;
+        DROP INDEX IF EXISTS idx_orders_created_at_order_id;
+        ALTER SEQUENCE order_items_id_seq OWNED BY NONE;
+
+        CREATE TABLE orders (
+            order_id VARCHAR(50) NOT NULL,
+            customer_id VARCHAR(50) NOT NULL,
+            total_amount DECIMAL(10,2) NOT NULL CHECK (total_amount >= 0),
+            status VARCHAR(50) DEFAULT 'pending',
+            created_at TIMESTAMP NOT NULL DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            payment_status VARCHAR(50),
+            transaction_id VARCHAR(100),
+            PRIMARY KEY (order_id, created_at),
+            FOREIGN KEY (customer_id)
+                REFERENCES customers(customer_id)
+                ON DELETE CASCADE
+        ) PARTITION BY RANGE (created_at);
+
+        CREATE TABLE order_items (
+            id INTEGER NOT NULL DEFAULT nextval('order_items_id_seq'),
+            order_id VARCHAR(50) NOT NULL,
+            product_id VARCHAR(50) NOT NULL,
+            quantity INTEGER NOT NULL CHECK (quantity > 0),
+            price DECIMAL(10,2) NOT NULL CHECK (price >= 0),
+            created_at TIMESTAMP NOT NULL,
+            PRIMARY KEY (id, created_at),
+            FOREIGN KEY (order_id, created_at)
+                REFERENCES orders(order_id, created_at)
+                ON DELETE CASCADE
+                ON UPDATE CASCADE,
+            FOREIGN KEY (product_id)
+                REFERENCES inventory(product_id)
+                ON DELETE CASCADE
+        ) PARTITION BY RANGE (created_at);
+
+        ALTER SEQUENCE order_items_id_seq OWNED BY order_items.id;
+
+        -- Partisi bulanan orders_pYYYYMM / order_items_pYYYYMM untuk semua
+        -- bulan di [p_from, p_to]. Tidak ada DEFAULT partition: order di
+        -- bulan tanpa partisi gagal, jadi partisi dibuat beberapa bulan di depan.
+        CREATE OR REPLACE FUNCTION create_order_partitions(p_from DATE, p_to DATE) RETURNS INTEGER AS $$
+        DECLARE
+            month_start DATE := date_trunc('month', p_from)::date;
+            month_end DATE;
+            created INTEGER := 0;
+        BEGIN
+            WHILE month_start <= p_to LOOP
+                month_end := (month_start + interval '1 month')::date;
+                IF to_regclass('orders_p' || to_char(month_start, 'YYYYMM')) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I PARTITION OF orders FOR VALUES FROM (%L) TO (%L)',
+                                   'orders_p' || to_char(month_start, 'YYYYMM'), month_start, month_end);
+                    created := created + 1;
+                END IF;
+                IF to_regclass('order_items_p' || to_char(month_start, 'YYYYMM')) IS NULL THEN
+                    EXECUTE format('CREATE TABLE %I PARTITION OF order_items FOR VALUES FROM (%L) TO (%L)',
+                                   'order_items_p' || to_char(month_start, 'YYYYMM'), month_start, month_end);
+                END IF;
+                month_start := month_end;
+            END LOOP;
+            RETURN created;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Lepas partisi bulan sebelum bulan p_before ke schema archive. Item
+        -- dilepas dulu; FK tabel yang dilepas dibuang supaya CASCADE dari
+        -- customers / inventory tidak menyentuh arsip. Rollup harian tidak diubah.
+        CREATE OR REPLACE FUNCTION archive_order_partitions(p_before DATE) RETURNS SETOF TEXT AS $$
+        DECLARE
+            part RECORD;
+            fk RECORD;
+            tbl TEXT;
+        BEGIN
+            CREATE SCHEMA IF NOT EXISTS archive;
+            FOR part IN
+                SELECT right(c.relname, 6) AS suffix
+                FROM pg_inherits i
+                JOIN pg_class c ON c.oid = i.inhrelid
+                WHERE i.inhparent = 'orders'::regclass
+                AND c.relname ~ '^orders_p[0-9]{6}$'
+                AND to_date(right(c.relname, 6), 'YYYYMM') < date_trunc('month', p_before)
+                ORDER BY 1
+            LOOP
+                FOREACH tbl IN ARRAY ARRAY['order_items_p' || part.suffix, 'orders_p' || part.suffix] LOOP
+                    IF to_regclass(tbl) IS NULL THEN
+                        CONTINUE;
+                    END IF;
+                    EXECUTE format('ALTER TABLE %I DETACH PARTITION %I',
+                                   CASE WHEN tbl LIKE 'order_items_p%' THEN 'order_items' ELSE 'orders' END, tbl);
+                    FOR fk IN
+                        SELECT conname FROM pg_constraint
+                        WHERE conrelid = tbl::regclass AND contype = 'f'
+                    LOOP
+                        EXECUTE format('ALTER TABLE %I DROP CONSTRAINT %I', tbl, fk.conname);
+                    END LOOP;
+                    EXECUTE format('ALTER TABLE %I SET SCHEMA archive', tbl);
+                END LOOP;
+                RETURN NEXT 'orders_p' || part.suffix;
+            END LOOP;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        SELECT create_order_partitions(
+            COALESCE((SELECT MIN(created_at) FROM orders_unpartitioned), CURRENT_TIMESTAMP)::date,
+            (CURRENT_DATE + make_interval(months => current_setting('app.partition_premake_months')::integer))::date
+        );
+
+        INSERT INTO orders (order_id, customer_id, total_amount, status, created_at, updated_at, payment_status, transaction_id)
+        SELECT order_id, customer_id, total_amount, status, COALESCE(created_at, CURRENT_TIMESTAMP), updated_at, payment_status, transaction_id
+        FROM orders_unpartitioned;
+
+        INSERT INTO order_items (id, order_id, product_id, quantity, price, created_at)
+        SELECT oi.id, oi.order_id, oi.product_id, oi.quantity, oi.price, o.created_at
+        FROM order_items_unpartitioned oi
+        JOIN orders o ON o.order_id = oi.order_id;
+
+        DROP TABLE order_items_unpartitioned;
+        DROP TABLE orders_unpartitioned;
+
+        -- Index di parent otomatis dibuat di setiap partisi, termasuk yang baru
+        CREATE INDEX idx_orders_customer_id ON orders(customer_id);
+        CREATE INDEX idx_orders_created_at_order_id ON orders(created_at DESC, order_id DESC);
+        CREATE INDEX idx_order_items_order_id ON order_items(order_id, created_at);
+
+        -- Item sekarang membawa created_at order-nya, rollup tidak perlu join
+        -- ke orders lagi (dan item yang ikut terhapus CASCADE tetap terhitung)
+        DROP FUNCTION IF EXISTS orders_rollup_remove_items();
+
+        CREATE OR REPLACE FUNCTION order_items_rollup_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO daily_product_rollup AS r (day, product_id, total_quantity, total_revenue)
+                SELECT created_at::date, product_id, -SUM(quantity), -SUM(quantity * price)
+                FROM old_rows
+                GROUP BY 1, 2
+                ON CONFLICT (day, product_id) DO UPDATE
+                SET total_quantity = r.total_quantity + EXCLUDED.total_quantity,
+                    total_revenue = r.total_revenue + EXCLUDED.total_revenue;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO daily_product_rollup AS r (day, product_id, total_quantity, total_revenue)
+                SELECT created_at::date, product_id, SUM(quantity), SUM(quantity * price)
+                FROM new_rows
+                GROUP BY 1, 2
+                ON CONFLICT (day, product_id) DO UPDATE
+                SET total_quantity = r.total_quantity + EXCLUDED.total_quantity,
+                    total_revenue = r.total_revenue + EXCLUDED.total_revenue;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION rebuild_daily_rollups() RETURNS void AS $$
+            DELETE FROM daily_order_rollup;
+            INSERT INTO daily_order_rollup (day, status, order_count, total_revenue)
+            SELECT created_at::date, COALESCE(status, 'unknown'), COUNT(*), COALESCE(SUM(total_amount), 0)
+            FROM orders
+            GROUP BY 1, 2;
+            DELETE FROM daily_product_rollup;
+            INSERT INTO daily_product_rollup (day, product_id, total_quantity, total_revenue)
+            SELECT created_at::date, product_id, SUM(quantity), SUM(quantity * price)
+            FROM order_items
+            GROUP BY 1, 2;
+        $$ LANGUAGE sql;
+
+        CREATE TRIGGER trg_orders_rollup_insert
+        AFTER INSERT ON orders REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_rollup_apply();
+
+        CREATE TRIGGER trg_orders_rollup_update
+        AFTER UPDATE ON orders REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_rollup_apply();
+
+        CREATE TRIGGER trg_orders_rollup_delete
+        AFTER DELETE ON orders REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION orders_rollup_apply();
+
+        CREATE TRIGGER trg_order_items_rollup_insert
+        AFTER INSERT ON order_items REFERENCING NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION order_items_rollup_apply();
+
+        CREATE TRIGGER trg_order_items_rollup_update
+        AFTER UPDATE ON order_items REFERENCING OLD TABLE AS old_rows NEW TABLE AS new_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION order_items_rollup_apply();
+
+        CREATE TRIGGER trg_order_items_rollup_delete
+        AFTER DELETE ON order_items REFERENCING OLD TABLE AS old_rows
+        FOR EACH STATEMENT EXECUTE FUNCTION order_items_rollup_apply();
+        """
+    },
+    # Trigger rollup tidak lagi meng-upsert baris (day, status) bersama di
+    # transaksi order (semua checkout antri di satu row lock). Delta ditulis
+    # append-only, report / maintenance melipatnya dengan fold_daily_rollups().
+    {
+        'version': 16,
+        'name': 'append_only_rollup_deltas',
+        'sql': """
+        CREATE TABLE IF NOT EXISTS daily_order_rollup_delta (
+            day DATE NOT NULL,
+            status VARCHAR(50) NOT NULL,
+            order_count INTEGER NOT NULL,
+            total_revenue DECIMAL(14,2) NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_daily_order_rollup_delta_day ON daily_order_rollup_delta(day);
+
+        CREATE TABLE IF NOT EXISTS daily_product_rollup_delta (
+            day DATE NOT NULL,
+            product_id VARCHAR(50) NOT NULL,
+            total_quantity INTEGER NOT NULL,
+            total_revenue DECIMAL(14,2) NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS idx_daily_product_rollup_delta_day ON daily_product_rollup_delta(day);
+
+        CREATE OR REPLACE FUNCTION orders_rollup_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP = 'INSERT' THEN
+                INSERT INTO daily_order_rollup_delta (day, status, order_count, total_revenue)
+                SELECT created_at::date, COALESCE(status, 'unknown'), COUNT(*), COALESCE(SUM(total_amount), 0)
+                FROM new_rows
+                GROUP BY 1, 2;
+            ELSIF TG_OP = 'UPDATE' THEN
+                INSERT INTO daily_order_rollup_delta (day, status, order_count, total_revenue)
+                SELECT day, status, SUM(order_count), SUM(total_revenue)
+                FROM (
+                    SELECT o.created_at::date AS day, COALESCE(o.status, 'unknown') AS status,
+                           -1 AS order_count, -o.total_amount AS total_revenue
+                    FROM old_rows o JOIN new_rows n ON n.order_id = o.order_id
+                    WHERE (o.status, o.total_amount, o.created_at) IS DISTINCT FROM (n.status, n.total_amount, n.created_at)
+                    UNION ALL
+                    SELECT n.created_at::date, COALESCE(n.status, 'unknown'), 1, n.total_amount
+                    FROM old_rows o JOIN new_rows n ON n.order_id = o.order_id
+                    WHERE (o.status, o.total_amount, o.created_at) IS DISTINCT FROM (n.status, n.total_amount, n.created_at)
+                ) delta
+                GROUP BY day, status;
+            ELSE
+                INSERT INTO daily_order_rollup_delta (day, status, order_count, total_revenue)
+                SELECT created_at::date, COALESCE(status, 'unknown'), -COUNT(*), -COALESCE(SUM(total_amount), 0)
+                FROM old_rows
+                GROUP BY 1, 2;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION order_items_rollup_apply() RETURNS trigger AS $$
+        BEGIN
+            IF TG_OP IN ('UPDATE', 'DELETE') THEN
+                INSERT INTO daily_product_rollup_delta (day, product_id, total_quantity, total_revenue)
+                SELECT created_at::date, product_id, -SUM(quantity), -SUM(quantity * price)
+                FROM old_rows
+                GROUP BY 1, 2;
+            END IF;
+            IF TG_OP IN ('INSERT', 'UPDATE') THEN
+                INSERT INTO daily_product_rollup_delta (day, product_id, total_quantity, total_revenue)
+                SELECT created_at::date, product_id, SUM(quantity), SUM(quantity * price)
+                FROM new_rows
+                GROUP BY 1, 2;
+            END IF;
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        -- Pindahkan delta ke rollup. Advisory lock: satu fold dalam satu waktu;
+        -- delta yang commit selama fold berjalan ikut fold berikutnya.
+        CREATE OR REPLACE FUNCTION fold_daily_rollups() RETURNS INTEGER AS $$
+        DECLARE
+            folded INTEGER := 0;
+            n INTEGER;
+        BEGIN
+            PERFORM pg_advisory_xact_lock(hashtext('fold_daily_rollups'));
+
+            WITH moved AS (
+                DELETE FROM daily_order_rollup_delta
+                RETURNING day, status, order_count, total_revenue
+            )
+            INSERT INTO daily_order_rollup AS r (day, status, order_count, total_revenue)
+            SELECT day, status, SUM(order_count), SUM(total_revenue)
+            FROM moved
+            GROUP BY day, status
+            ON CONFLICT (day, status) DO UPDATE
+            SET order_count = r.order_count + EXCLUDED.order_count,
+                total_revenue = r.total_revenue + EXCLUDED.total_revenue;
+            GET DIAGNOSTICS n = ROW_COUNT;
+            folded := folded + n;
+
+            WITH moved AS (
+                DELETE FROM daily_product_rollup_delta
+                RETURNING day, product_id, total_quantity, total_revenue
+            )
+            INSERT INTO daily_product_rollup AS r (day, product_id, total_quantity, total_revenue)
+            SELECT day, product_id, SUM(total_quantity), SUM(total_revenue)
+            FROM moved
+            GROUP BY day, product_id
+            ON CONFLICT (day, product_id) DO UPDATE
+            SET total_quantity = r.total_quantity + EXCLUDED.total_quantity,
+                total_revenue = r.total_revenue + EXCLUDED.total_revenue;
+            GET DIAGNOSTICS n = ROW_COUNT;
+            folded := folded + n;
+
+            RETURN folded;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        CREATE OR REPLACE FUNCTION rebuild_daily_rollups() RETURNS void AS $$
+            SELECT pg_advisory_xact_lock(hashtext('fold_daily_rollups'));
+            DELETE FROM daily_order_rollup_delta;
+            DELETE FROM daily_order_rollup;
+            INSERT INTO daily_order_rollup (day, status, order_count, total_revenue)
+            SELECT created_at::date, COALESCE(status, 'unknown'), COUNT(*), COALESCE(SUM(total_amount), 0)
+            FROM orders
+            GROUP BY 1, 2;
+            DELETE FROM daily_product_rollup_delta;
+            DELETE FROM daily_product_rollup;
+            INSERT INTO daily_product_rollup (day, product_id, total_quantity, total_revenue)
+            SELECT created_at::date, product_id, SUM(quantity), SUM(quantity * price)
+            FROM order_items
+            GROUP BY 1, 2;
+        $$ LANGUAGE sql;
+        """
+    },
+    # Stok yang benar-benar tersedia: pengurangan lewat shard hot SKU belum
+    # masuk inventory.stock_quantity sampai compact_stock_shards jalan.
+    # updated_at ikut bergerak dengan shard tanpa menyentuh row inventory.
+    {
+        'version': 17,
+        'name': 'inventory_available_view',
+        'sql': """
+        CREATE OR REPLACE VIEW inventory_available AS
+        SELECT i.product_id,
+               i.product_name,
+               i.description,
+               i.price,
+               i.category,
+               i.stock_quantity - COALESCE(s.sold, 0) AS stock_quantity,
+               i.alert_threshold,
+               i.low_threshold,
+               CASE
+                   WHEN i.stock_quantity - COALESCE(s.sold, 0) <= i.alert_threshold THEN 'Critical'
+                   WHEN i.stock_quantity - COALESCE(s.sold, 0) <= i.low_threshold THEN 'Low'
+                   ELSE 'Normal'
+               END AS stock_status,
+               GREATEST(i.updated_at, s.updated_at) AS updated_at
+        FROM inventory i
+        LEFT JOIN (
+            SELECT product_id, SUM(sold) AS sold, MAX(updated_at) AS updated_at
+            FROM inventory_stock_shards
+            GROUP BY product_id
+        ) s ON s.product_id = i.product_id;
+        """
+    },    # Versi cache GET /customers (ETag), bergerak lewat trigger karena customers
+    # tidak punya writer di aplikasi
+    {
+        'version': 18,
+        'name': 'customers_version_seq',
+        'sql': """
+        CREATE SEQUENCE IF NOT EXISTS customers_version_seq;
+
+        CREATE OR REPLACE FUNCTION customers_changed() RETURNS trigger AS $$
+        BEGIN
+            PERFORM nextval('customers_version_seq');
+            RETURN NULL;
+        END;
+        $$ LANGUAGE plpgsql;
+
+        DROP TRIGGER IF EXISTS trg_customers_changed ON customers;
+        CREATE TRIGGER trg_customers_changed
+        AFTER INSERT OR UPDATE OR DELETE OR TRUNCATE ON customers
+        FOR EACH STATEMENT EXECUTE FUNCTION customers_changed();
+        """
+    },    # Batas Low/Normal kembali ke report lama (stock < 50 = Low): 50 unit tetap
+    # Normal. Default yang sudah diubah operator tidak disentuh
+    {
+        'version': 19,
+        'name': 'default_low_threshold_exclusive_50',
+        'sql': """
+        ALTER TABLE inventory ALTER COLUMN low_threshold SET DEFAULT 49;
+
+        UPDATE stock_thresholds
+        SET low_threshold = 49, updated_at = CURRENT_TIMESTAMP
+        WHERE scope = 'default' AND scope_key = '*' AND low_threshold = 50;
+        """
+    },
+]
+
+
+def migration_checksum(migration):
+    if 'indexes' in migration:
+        body = '\n'.join(sql for _, sql in migration['indexes'])
+    else:
+        body = migration['sql']
+    normalized = '\n'.join(line.strip() for line in body.strip().splitlines() if line.strip())
+    return hashlib.sha256(normalized.encode('utf-8')).hexdigest()
+
+
+def create_index_concurrently(cur, index_name, sql):
+    # Build CONCURRENTLY yang gagal meninggalkan index INVALID, buang dulu
+    cur.execute("""
+        SELECT NOT i.indisvalid
+        FROM pg_index i
+        JOIN pg_class c ON c.oid = i.indexrelid
+        WHERE c.relname = %s
+    """, (index_name,))
+    row = cur.fetchone()
+    if row and row[0]:
+        print(f"♻️ Dropping invalid index {index_name}")
+        cur.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {index_name}")
+    cur.execute(sql)
+
+
+def apply_migrations(conn, premake_months=PARTITION_PREMAKE_MONTHS, allow_blocking=False):
+    """
+    Apply pending MIGRATIONS in version order under a session advisory
+    lock, so concurrent init runs wait instead of racing. Without
+    allow_blocking, the run stops before the first pending 'blocking'
+    migration. Returns (versions applied by this run, versions held back).
+    """
+    conn.commit()
+    conn.autocommit = True
+    cur = conn.cursor()
+    applied_now = []
+    held_back = []
+
+    try:
+        cur.execute("SELECT pg_advisory_lock(hashtext('schema_migrations'))")
+        cur.execute("SELECT set_config('app.partition_premake_months', %s, false)", (str(premake_months),))
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                name VARCHAR(100) NOT NULL,
+                checksum CHAR(64) NOT NULL,
+                applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+                duration_ms INTEGER
+            );
+        """)
+        cur.execute("SELECT version, checksum FROM schema_migrations")
+        applied = dict(cur.fetchall())
+
+        for migration in sorted(MIGRATIONS, key=lambda m: m['version']):
+            version, name = migration['version'], migration['name']
+            checksum = migration_checksum(migration)
+
+            if version in applied:
+                if applied[version] != checksum:
+                    raise RuntimeError(
+                        f"Migration {version} ({name}) changed after it was applied; add a new migration instead"
+                    )
+                continue
+
+            # Migration berikutnya bisa bergantung pada yang ini, jadi berhenti di sini
+            if held_back or (migration.get('blocking') and not allow_blocking):
+                held_back.append(version)
+                continue
+
+            print(f"🛠 Applying migration {version} ({name})")
+            started = time.time()
+            if 'indexes' in migration:
+                for index_name, sql in migration['indexes']:
+                    create_index_concurrently(cur, index_name, sql)
+                cur.execute(
+                    "INSERT INTO schema_migrations (version, name, checksum, duration_ms) VALUES (%s, %s, %s, %s)",
+                    (version, name, checksum, int((time.time() - started) * 1000))
+                )
+            else:
+                conn.autocommit = False
+                try:
+                    cur.execute(migration['sql'])
+                    cur.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum, duration_ms) VALUES (%s, %s, %s, %s)",
+                        (version, name, checksum, int((time.time() - started) * 1000))
+                    )
+                    conn.commit()
+                except Exception:
+                    conn.rollback()
+                    raise
+                finally:
+                    conn.autocommit = True
+            applied_now.append(version)
+
+        if held_back:
+            print(f"⏸ Blocking migration {held_back[0]} pending, run with allow_blocking_migrations in a maintenance window")
+        return applied_now, held_back
+    finally:
+        try:
+            cur.execute("SELECT pg_advisory_unlock(hashtext('schema_migrations'))")
+        finally:
+            cur.close()
+            conn.autocommit = False
+
+
+def maintain_order_partitions(conn, premake_months=PARTITION_PREMAKE_MONTHS,
+                              retain_months=PARTITION_RETAIN_MONTHS):
+    """
+    Create monthly orders / order_items partitions through premake_months
+    ahead and, when retain_months > 0, detach partitions older than that
+    many months into the archive schema. Each step commits on its own so
+    the exclusive lock on the parent tables is held briefly.
+    Returns (partitions_created, partitions_archived).
+    """
+    cur = conn.cursor()
+    archived = []
+
+    try:
+        cur.execute("SET LOCAL lock_timeout = %s", (PARTITION_LOCK_TIMEOUT_MS,))
+        # Lock yang sama dipakai order_management saat membuat partisi on demand
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('create_order_partitions'))")
+        cur.execute(
+            "SELECT create_order_partitions(CURRENT_DATE, (CURRENT_DATE + make_interval(months => %s))::date)",
+            (premake_months,)
+        )
+        created = cur.fetchone()[0]
+        conn.commit()
+
+        if retain_months > 0:
+            cur.execute("SET LOCAL lock_timeout = %s", (PARTITION_LOCK_TIMEOUT_MS,))
+            cur.execute(
+                "SELECT * FROM archive_order_partitions((date_trunc('month', CURRENT_DATE) - make_interval(months => %s))::date)",
+                (retain_months,)
+            )
+            archived = [row[0] for row in cur.fetchall()]
+            conn.commit()
+
+        return created, archived
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+
+def run_maintenance(event):
+    """
+    {"action": "maintenance"} - the scheduled run. Creates / archives
+    order partitions and folds the rollup deltas; never applies
+    migrations or inserts data.
+    """
+    premake_months = int(event.get("premake_months", PARTITION_PREMAKE_MONTHS))
+    retain_months = int(event.get("retain_months", PARTITION_RETAIN_MONTHS))
+
+    conn = get_db_connection()
+    cur = conn.cursor()
+
+    try:
+        cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+        schema_version = 0
+        if cur.fetchone()[0]:
+            cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+            schema_version = cur.fetchone()[0]
+        conn.commit()
+        # Partisi ada sejak migration 15, delta rollup sejak migration 16
+        if schema_version < 16:
+            raise RuntimeError(f"Schema at version {schema_version}, maintenance needs migration 16; run init_database first")
+
+        partitions_created, partitions_archived = maintain_order_partitions(conn, premake_months, retain_months)
+        cur.execute("SELECT fold_daily_rollups()")
+        rollups_folded = cur.fetchone()[0]
+        conn.commit()
+        print(f"✅ Maintenance: {partitions_created} partition(s) created, {len(partitions_archived)} archived, {rollups_folded} rollup row(s) folded")
+
+        return {
+            "statusCode": 200,
+            "body": json.dumps({
+                "message": "Maintenance finished",
+                "schema_version": schema_version,
+                "partitions_created": partitions_created,
+                "partitions_archived": partitions_archived,
+                "rollups_folded": rollups_folded,
+                "timestamp": datetime.utcnow().isoformat()
+            })
+        }
+
+    except Exception as e:
+        conn.rollback()
+        print("🔥 FATAL ERROR")
+        print(traceback.format_exc())
+        return {
+            "statusCode": 500,
+            "body": json.dumps({
+                "message": "Maintenance failed",
+                "error": str(e)
+            })
+        }
+
+    finally:
+        cur.close()
+        release_db_connection(conn)
 
 
 def lambda_handler(event, context):
+    # Jalur terjadwal: hanya partisi + fold rollup, tanpa migration
+    if event.get("action") == "maintenance":
+        return run_maintenance(event)
+
     print("🚀 INIT DATABASE STARTED")
 
     insert_sample_data = event.get("insert_sample_data", True)
     drop_existing = event.get("drop_existing", False)
+    synthetic_data = event.get("synthetic_data")
+    premake_months = int(event.get("premake_months", PARTITION_PREMAKE_MONTHS))
+    retain_months = int(event.get("retain_months", PARTITION_RETAIN_MONTHS))
+    # Tabel yang baru di-drop kosong, migration blocking tidak mengunci apa-apa
+    allow_blocking = bool(event.get("allow_blocking_migrations", False)) or drop_existing
 
     conn = get_db_connection()
     cur = conn.cursor()
@@ -38,6 +1105,19 @@ def lambda_handler(event, context):
         if drop_existing:
             print("⚠️ Dropping existing tables")
             cur.execute("""
+                DROP TABLE IF EXISTS schema_migrations CASCADE;
+                DROP TABLE IF EXISTS daily_product_rollup_delta CASCADE;
+                DROP TABLE IF EXISTS daily_order_rollup_delta CASCADE;
+                DROP TABLE IF EXISTS daily_product_rollup CASCADE;
+                DROP TABLE IF EXISTS daily_order_rollup CASCADE;
+                DROP TABLE IF EXISTS stock_thresholds CASCADE;
+                DROP TABLE IF EXISTS low_stock_digest_state CASCADE;
+                DROP TABLE IF EXISTS job_watermarks CASCADE;
+                DROP TABLE IF EXISTS inventory_applied_orders CASCADE;
+                DROP TABLE IF EXISTS low_stock_alert_log CASCADE;
+                DROP TABLE IF EXISTS inventory_stock_shards CASCADE;
+                DROP TABLE IF EXISTS workflow_status_cache CASCADE;
+                DROP TABLE IF EXISTS order_executions CASCADE;
                 DROP TABLE IF EXISTS order_items CASCADE;
                 DROP TABLE IF EXISTS orders CASCADE;
                 DROP TABLE IF EXISTS inventory CASCADE;
@@ -46,289 +1126,50 @@ def lambda_handler(event, context):
             conn.commit()
 
         # =====================================================
-        # CREATE BASE TABLES (SAFE)
+        # SCHEMA MIGRATIONS
         # =====================================================
-        print("📦 Creating tables")
-
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS customers (
-                customer_id VARCHAR(50) PRIMARY KEY,
-                customer_name VARCHAR(100) NOT NULL,
-                email VARCHAR(100) UNIQUE NOT NULL,
-                phone VARCHAR(20),
-                address TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS inventory (
-                product_id VARCHAR(50) PRIMARY KEY,
-                product_name VARCHAR(100) NOT NULL,
-                description TEXT,
-                price DECIMAL(10,2) NOT NULL CHECK (price >= 0),
-                stock_quantity INTEGER NOT NULL DEFAULT 0 CHECK (stock_quantity >= 0),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            );
-        """)
-
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS orders (
-                order_id VARCHAR(50) PRIMARY KEY,
-                customer_id VARCHAR(50) NOT NULL,
-                total_amount DECIMAL(10,2) NOT NULL CHECK (total_amount >= 0),
-                status VARCHAR(50) DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (customer_id)
-                    REFERENCES customers(customer_id)
-                    ON DELETE CASCADE
-            );
-        """)
-
-        cur.execute("""
-            CREATE TABLE IF NOT EXISTS order_items (
-                id SERIAL PRIMARY KEY,
-                order_id VARCHAR(50) NOT NULL,
-                product_id VARCHAR(50) NOT NULL,
-                quantity INTEGER NOT NULL CHECK (quantity > 0),
-                price DECIMAL(10,2) NOT NULL CHECK (price >= 0),
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                FOREIGN KEY (order_id)
-                    REFERENCES orders(order_id)
-                    ON DELETE CASCADE,
-                FOREIGN KEY (product_id)
-                    REFERENCES inventory(product_id)
-                    ON DELETE CASCADE
-            );
-        """)
-
+        applied, held_back = apply_migrations(conn, premake_months, allow_blocking)
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        schema_version = cur.fetchone()[0]
         conn.commit()
-        print("✅ Base tables ready")
+        print(f"✅ Schema at version {schema_version} ({len(applied)} migration(s) applied, {len(held_back)} held back)")
 
         # =====================================================
-        # SAFE ALTER (ENSURE COLUMNS EXIST)
+        # ORDER PARTITIONS
         # =====================================================
-        print("🛠 Ensuring missing columns")
-
-        safe_alters = [
-            # customers.updated_at
-            """
-            DO $
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name='customers'
-                    AND column_name='updated_at'
-                ) THEN
-                    ALTER TABLE customers 
-                    ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
-                END IF;
-            END $;
-            """,
-
-            # customers.phone
-            """
-            DO $
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name='customers'
-                    AND column_name='phone'
-                ) THEN
-                    ALTER TABLE customers ADD COLUMN phone VARCHAR(20);
-                END IF;
-            END $;
-            """,
-
-            # customers.address
-            """
-            DO $
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name='customers'
-                    AND column_name='address'
-                ) THEN
-                    ALTER TABLE customers ADD COLUMN address TEXT;
-                END IF;
-            END $;
-            """,
-
-            # inventory.description
-            """
-            DO $
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name='inventory'
-                    AND column_name='description'
-                ) THEN
-                    ALTER TABLE inventory ADD COLUMN description TEXT;
-                END IF;
-            END $;
-            """,
-
-            # inventory.updated_at
-            """
-            DO $
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name='inventory'
-                    AND column_name='updated_at'
-                ) THEN
-                    ALTER TABLE inventory 
-                    ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
-                END IF;
-            END $;
-            """,
-
-            # inventory.category
-            """
-            DO $
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name='inventory'
-                    AND column_name='category'
-                ) THEN
-                    ALTER TABLE inventory ADD COLUMN category VARCHAR(50);
-                END IF;
-            END $;
-            """,
-
-            # orders.updated_at
-            """
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name='orders'
-                    AND column_name='updated_at'
-                ) THEN
-                    ALTER TABLE orders 
-                    ADD COLUMN updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP;
-                END IF;
-            END $$;
-            """,
-
-            # orders.payment_status
-            """
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name='orders'
-                    AND column_name='payment_status'
-                ) THEN
-                    ALTER TABLE orders ADD COLUMN payment_status VARCHAR(50);
-                END IF;
-            END $$;
-            """,
-
-            # orders.transaction_id
-            """
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM information_schema.columns
-                    WHERE table_name='orders'
-                    AND column_name='transaction_id'
-                ) THEN
-                    ALTER TABLE orders ADD COLUMN transaction_id VARCHAR(100);
-                END IF;
-            END $$;
-            """
-        ]
-
-        for idx, sql in enumerate(safe_alters):
-            try:
-                cur.execute(sql)
-                conn.commit()
-                print(f"✅ Column check/add completed ({idx + 1}/{len(safe_alters)})")
-            except Exception as e:
-                conn.rollback()
-                print(f"⚠️ ALTER skipped ({idx + 1}): {e}")
+        # Partisi ada sejak migration 15, delta rollup sejak migration 16
+        partitions_created, partitions_archived = 0, []
+        if schema_version >= 15:
+            partitions_created, partitions_archived = maintain_order_partitions(conn, premake_months, retain_months)
+            print(f"✅ Order partitions: {partitions_created} created, {len(partitions_archived)} archived")
 
-        # =====================================================
-        # SAFE INDEX CREATION
-        # =====================================================
-        print("⚡ Creating indexes")
-
-        safe_indexes = [
-            """
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM pg_indexes
-                    WHERE tablename='orders'
-                    AND indexname='idx_orders_customer_id'
-                ) THEN
-                    CREATE INDEX idx_orders_customer_id
-                    ON orders(customer_id);
-                END IF;
-            END $$;
-            """,
-
-            """
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM pg_indexes
-                    WHERE tablename='inventory'
-                    AND indexname='idx_inventory_category'
-                ) THEN
-                    CREATE INDEX idx_inventory_category
-                    ON inventory(category);
-                END IF;
-            END $$;
-            """,
-
-            """
-            DO $$
-            BEGIN
-                IF NOT EXISTS (
-                    SELECT 1 FROM pg_indexes
-                    WHERE tablename='customers'
-                    AND indexname='idx_customers_email'
-                ) THEN
-                    CREATE INDEX idx_customers_email
-                    ON customers(email);
-                END IF;
-            END $$;
-            """
-        ]
+        rollups_folded = 0
+        if schema_version >= 16:
+            cur.execute("SELECT fold_daily_rollups()")
+            rollups_folded = cur.fetchone()[0]
+            conn.commit()
 
-        for idx, sql in enumerate(safe_indexes):
-            try:
-                cur.execute(sql)
-                conn.commit()
-                print(f"✅ Index check/creation completed ({idx + 1}/{len(safe_indexes)})")
-            except Exception as e:
-                conn.rollback()
-                print(f"⚠️ INDEX skipped ({idx + 1}): {e}")
+        # Sample / synthetic data ditulis untuk schema terbaru
+        if held_back and (insert_sample_data or synthetic_data):
+            print("⏸ Skipping sample / synthetic data until the held back migrations are applied")
+            insert_sample_data, synthetic_data = False, None
 
         # =====================================================
         # SAMPLE DATA
         # =====================================================
         if insert_sample_data:
             print("🌱 Inserting sample data")
-            
-            # Verify critical columns exist before inserting
-            cur.execute("""
-                SELECT column_name 
-                FROM information_schema.columns 
-                WHERE table_name = 'inventory'
-                ORDER BY ordinal_position;
-            """)
-            inventory_columns = [row[0] for row in cur.fetchall()]
-            print(f"📋 Inventory columns: {', '.join(inventory_columns)}")
-            
             insert_samples(cur, conn)
 
+        # =====================================================
+        # SYNTHETIC LOAD DATA (OPTIONAL)
+        # =====================================================
+        synthetic_result = None
+        if synthetic_data:
+            print("🧪 Generating synthetic dataset")
+            options = synthetic_data if isinstance(synthetic_data, dict) else {}
+            synthetic_result = seed_synthetic_data(conn, **options)
+
         print("🎉 DATABASE INIT SUCCESS")
 
         return {
@@ -336,7 +1177,14 @@ def lambda_handler(event, context):
             "body": json.dumps({
                 "message": "Database initialized successfully",
                 "sample_data": insert_sample_data,
+                "synthetic_data": synthetic_result,
                 "dropped_existing": drop_existing,
+                "schema_version": schema_version,
+                "migrations_applied": applied,
+                "migrations_held_back": held_back,
+                "partitions_created": partitions_created,
+                "partitions_archived": partitions_archived,
+                "rollups_folded": rollups_folded,
                 "timestamp": datetime.utcnow().isoformat()
             })
         }
@@ -356,7 +1204,7 @@ def lambda_handler(event, context):
 
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
 
 
 # =====================================================
@@ -364,19 +1212,7 @@ def lambda_handler(event, context):
 # =====================================================
 def insert_samples(cur, conn):
     """Insert sample data for testing"""
-    
-    # Check which columns exist in inventory table
-    cur.execute("""
-        SELECT column_name 
-        FROM information_schema.columns 
-        WHERE table_name = 'inventory';
-    """)
-    inventory_cols = [row[0] for row in cur.fetchall()]
-    has_description = 'description' in inventory_cols
-    has_category = 'category' in inventory_cols
-    
-    print(f"🔍 Inventory has description: {has_description}, category: {has_category}")
-    
+
     # Sample customers
     cur.execute("""
         INSERT INTO customers (customer_id, customer_name, email, phone, address)
@@ -387,68 +1223,183 @@ def insert_samples(cur, conn):
         ON CONFLICT (customer_id) DO NOTHING;
     """)
 
-    # Sample inventory - dynamic based on available columns
-    if has_description and has_category:
-        cur.execute("""
-            INSERT INTO inventory (
-                product_id, product_name, description, price, stock_quantity, category
-            )
-            VALUES 
-                ('PROD001', 'Laptop Pro', 'High-performance laptop with 16GB RAM', 1200.00, 10, 'Electronics'),
-                ('PROD002', 'Wireless Mouse', 'Ergonomic wireless mouse', 25.99, 50, 'Electronics'),
-                ('PROD003', 'Mechanical Keyboard', 'RGB mechanical gaming keyboard', 89.99, 30, 'Electronics'),
-                ('PROD004', 'USB-C Cable', '2m USB-C charging cable', 12.99, 100, 'Accessories'),
-                ('PROD005', 'Laptop Bag', 'Water-resistant laptop backpack', 45.00, 25, 'Accessories')
-            ON CONFLICT (product_id) DO NOTHING;
-        """)
-    elif has_category:
-        cur.execute("""
-            INSERT INTO inventory (
-                product_id, product_name, price, stock_quantity, category
-            )
-            VALUES 
-                ('PROD001', 'Laptop Pro', 1200.00, 10, 'Electronics'),
-                ('PROD002', 'Wireless Mouse', 25.99, 50, 'Electronics'),
-                ('PROD003', 'Mechanical Keyboard', 89.99, 30, 'Electronics'),
-                ('PROD004', 'USB-C Cable', 12.99, 100, 'Accessories'),
-                ('PROD005', 'Laptop Bag', 45.00, 25, 'Accessories')
-            ON CONFLICT (product_id) DO NOTHING;
-        """)
-    else:
-        cur.execute("""
-            INSERT INTO inventory (
-                product_id, product_name, price, stock_quantity
-            )
-            VALUES 
-                ('PROD001', 'Laptop Pro', 1200.00, 10),
-                ('PROD002', 'Wireless Mouse', 25.99, 50),
-                ('PROD003', 'Mechanical Keyboard', 89.99, 30),
-                ('PROD004', 'USB-C Cable', 12.99, 100),
-                ('PROD005', 'Laptop Bag', 45.00, 25)
-            ON CONFLICT (product_id) DO NOTHING;
-        """)
-
-    # Sample orders
+    # Sample inventory (description/category dijamin ada oleh migration 2)
     cur.execute("""
-        INSERT INTO orders (
-            order_id, customer_id, total_amount, status, payment_status, transaction_id
+        INSERT INTO inventory (
+            product_id, product_name, description, price, stock_quantity, category
         )
         VALUES 
-            ('ORD001', 'CUST001', 1225.99, 'completed', 'success', 'TXN-001'),
-            ('ORD002', 'CUST002', 115.98, 'pending', 'pending', 'TXN-002')
-        ON CONFLICT (order_id) DO NOTHING;
+            ('PROD001', 'Laptop Pro', 'High-performance laptop with 16GB RAM', 1200.00, 10, 'Electronics'),
+            ('PROD002', 'Wireless Mouse', 'Ergonomic wireless mouse', 25.99, 50, 'Electronics'),
+            ('PROD003', 'Mechanical Keyboard', 'RGB mechanical gaming keyboard', 89.99, 30, 'Electronics'),
+            ('PROD004', 'USB-C Cable', '2m USB-C charging cable', 12.99, 100, 'Accessories'),
+            ('PROD005', 'Laptop Bag', 'Water-resistant laptop backpack', 45.00, 25, 'Accessories')
+        ON CONFLICT (product_id) DO NOTHING;
     """)
 
-    # Sample order items
+    # Sample orders + items. order_id tidak unik lagi di level tabel (PK
+    # partisi = order_id, created_at), jadi order yang sudah ada dilewati dan
+    # item hanya masuk untuk order yang baru dibuat, dengan created_at order-nya
     cur.execute("""
-        INSERT INTO order_items (order_id, product_id, quantity, price)
-        VALUES 
+        WITH new_orders AS (
+            INSERT INTO orders (
+                order_id, customer_id, total_amount, status, payment_status, transaction_id
+            )
+            SELECT v.*
+            FROM (VALUES 
+                ('ORD001', 'CUST001', 1225.99, 'completed', 'success', 'TXN-001'),
+                ('ORD002', 'CUST002', 115.98, 'pending', 'pending', 'TXN-002')
+            ) AS v(order_id, customer_id, total_amount, status, payment_status, transaction_id)
+            WHERE NOT EXISTS (SELECT 1 FROM orders o WHERE o.order_id = v.order_id)
+            RETURNING order_id, created_at
+        )
+        INSERT INTO order_items (order_id, product_id, quantity, price, created_at)
+        SELECT v.order_id, v.product_id, v.quantity, v.price, n.created_at
+        FROM (VALUES 
             ('ORD001', 'PROD001', 1, 1200.00),
             ('ORD001', 'PROD002', 1, 25.99),
             ('ORD002', 'PROD003', 1, 89.99),
             ('ORD002', 'PROD002', 1, 25.99)
-        ON CONFLICT DO NOTHING;
+        ) AS v(order_id, product_id, quantity, price)
+        JOIN new_orders n ON n.order_id = v.order_id;
     """)
 
     conn.commit()
-    print("✅ Sample data inserted successfully")
\ No newline at end of file
+    print("✅ Sample data inserted successfully")
+
+
+# =====================================================
+# SYNTHETIC LOAD DATA
+# =====================================================
+# Deterministic (seeded) dataset for capacity testing, streamed in with
+# COPY FROM STDIN in chunks so memory stays bounded. Product popularity is
+# Zipf-like: the product at popularity rank r is picked with weight
+# 1 / r^zipf_s, so a few products take most of the order lines.
+
+SYNTHETIC_CATEGORIES = ['Electronics', 'Accessories', 'Home', 'Books', 'Sports', 'Toys', 'Beauty', 'Grocery']
+SYNTHETIC_STATUSES = ['delivered', 'shipped', 'processing', 'pending', 'cancelled', 'failed']
+SYNTHETIC_STATUS_WEIGHTS = [55, 15, 10, 10, 6, 4]
+# Akhir rentang order default; tetap, supaya seed yang sama = data yang sama
+SYNTHETIC_DEFAULT_END_DATE = '2026-01-01'
+
+# Trigger yang dimatikan selama COPY, dihitung ulang sekali di akhir
+SYNTHETIC_DISABLED_TRIGGERS = [
+    ('inventory', 'trg_inventory_apply_stock_thresholds'),
+    ('orders', 'trg_orders_rollup_insert'),
+    ('order_items', 'trg_order_items_rollup_insert'),
+]
+
+
+def copy_rows(cur, table, columns, rows):
+    """COPY one chunk of already formatted, tab separated lines."""
+    buffer = io.StringIO()
+    buffer.write('\n'.join(rows))
+    buffer.write('\n')
+    buffer.seek(0)
+    cur.copy_expert(f"COPY {table} ({', '.join(columns)}) FROM STDIN", buffer)
+
+
+def seed_synthetic_data(conn, customers=1000, products=500, orders=100000, seed=42,
+                        days=90, zipf_s=1.1, chunk_size=50000, prefix='SYN',
+                        end_date=SYNTHETIC_DEFAULT_END_DATE):
+    """
+    Generate customers, products and orders (with 1-4 items each) and
+    load them in one transaction. Orders fall in the `days` before
+    end_date. Same arguments, same data. IDs are
+    <prefix>-C/P/O<n>; seed into an empty database (drop_existing) or use
+    a different prefix.
+    """
+    rng = random.Random(seed)
+    started = time.time()
+    cur = conn.cursor()
+
+    try:
+        # Order lama jatuh di bulan yang belum tentu punya partisi
+        window_end = datetime.strptime(str(end_date), '%Y-%m-%d')
+        window_start = window_end - timedelta(days=days)
+        cur.execute("SELECT create_order_partitions(%s, %s)", (window_start.date(), window_end.date()))
+
+        for table, trigger in SYNTHETIC_DISABLED_TRIGGERS:
+            cur.execute(f"ALTER TABLE {table} DISABLE TRIGGER {trigger}")
+
+        # Customers
+        for offset in range(0, customers, chunk_size):
+            copy_rows(cur, 'customers', ['customer_id', 'customer_name', 'email'], [
+                f"{prefix}-C{n:08d}\tCustomer {n}\t{prefix.lower()}-c{n}@example.com"
+                for n in range(offset, min(offset + chunk_size, customers))
+            ])
+
+        # Products: harga dan stok acak, ranking popularitas diacak terpisah
+        prices = []
+        product_rows = []
+        for n in range(products):
+            price = round(rng.uniform(2, 500), 2)
+            prices.append(price)
+            product_rows.append(
+                f"{prefix}-P{n:06d}\tProduct {n}\t{price:.2f}\t{rng.randint(0, 1000)}\t"
+                f"{SYNTHETIC_CATEGORIES[n % len(SYNTHETIC_CATEGORIES)]}"
+            )
+        for offset in range(0, products, chunk_size):
+            copy_rows(cur, 'inventory', ['product_id', 'product_name', 'price', 'stock_quantity', 'category'],
+                      product_rows[offset:offset + chunk_size])
+        del product_rows
+
+        by_popularity = list(range(products))
+        rng.shuffle(by_popularity)
+        cumulative = []
+        total = 0.0
+        for rank in range(1, products + 1):
+            total += 1.0 / (rank ** zipf_s)
+            cumulative.append(total)
+
+        # Orders + items, urut waktu dalam rentang `days` hari terakhir
+        step = timedelta(days=days) / max(orders, 1)
+        item_count = 0
+        for offset in range(0, orders, chunk_size):
+            order_rows = []
+            item_rows = []
+            end = min(offset + chunk_size, orders)
+            statuses = rng.choices(SYNTHETIC_STATUSES, weights=SYNTHETIC_STATUS_WEIGHTS, k=end - offset)
+            for n in range(offset, end):
+                order_id = f"{prefix}-O{n:09d}"
+                created_at = str(window_start + step * n)
+                picked = rng.choices(by_popularity, cum_weights=cumulative, k=rng.choice((1, 1, 2, 2, 3, 4)))
+                total_amount = 0.0
+                for product in sorted(set(picked)):
+                    quantity = rng.randint(1, 3)
+                    total_amount += prices[product] * quantity
+                    item_rows.append(f"{order_id}\t{prefix}-P{product:06d}\t{quantity}\t{prices[product]:.2f}\t{created_at}")
+                order_rows.append(
+                    f"{order_id}\t{prefix}-C{rng.randrange(customers):08d}\t{total_amount:.2f}\t"
+                    f"{statuses[n - offset]}\t{created_at}\t{created_at}"
+                )
+            copy_rows(cur, 'orders', ['order_id', 'customer_id', 'total_amount', 'status', 'created_at', 'updated_at'], order_rows)
+            copy_rows(cur, 'order_items', ['order_id', 'product_id', 'quantity', 'price', 'created_at'], item_rows)
+            item_count += len(item_rows)
+            print(f"  {end}/{orders} orders")
+
+        cur.execute("SELECT sync_inventory_stock_thresholds()")
+        cur.execute("SELECT rebuild_daily_rollups()")
+        for table, trigger in SYNTHETIC_DISABLED_TRIGGERS:
+            cur.execute(f"ALTER TABLE {table} ENABLE TRIGGER {trigger}")
+        conn.commit()
+
+        for table in ('customers', 'inventory', 'orders', 'order_items'):
+            cur.execute(f"ANALYZE {table}")
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+    elapsed = round(time.time() - started, 2)
+    print(f"✅ Synthetic data loaded in {elapsed}s")
+    return {
+        'customers': customers,
+        'products': products,
+        'orders': orders,
+        'order_items': item_count,
+        'seed': seed,
+        'seconds': elapsed
+    }
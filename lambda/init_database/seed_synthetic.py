@@ -0,0 +1,59 @@
+"""
+Build a synthetic capacity-test dataset locally.
+
+Creates the schema through init_database (without the hand-written sample
+rows) and then streams the generated data in with COPY.
+
+Usage:
+    DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... \
+    python seed_synthetic.py --orders 1000000 --products 5000 --customers 100000 --drop
+"""
+import argparse
+import json
+import os
+import sys
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'layer', 'python'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import lambda_function as init_database
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed a deterministic synthetic dataset with COPY')
+    parser.add_argument('--customers', type=int, default=10000)
+    parser.add_argument('--products', type=int, default=1000)
+    parser.add_argument('--orders', type=int, default=1000000)
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--days', type=int, default=90)
+    parser.add_argument('--end-date', default=init_database.SYNTHETIC_DEFAULT_END_DATE,
+                        help='last day of the order window (YYYY-MM-DD)')
+    parser.add_argument('--zipf-s', type=float, default=1.1)
+    parser.add_argument('--chunk-size', type=int, default=50000)
+    parser.add_argument('--prefix', default='SYN')
+    parser.add_argument('--drop', action='store_true', help='drop existing tables first')
+    parser.add_argument('--allow-blocking-migrations', action='store_true',
+                        help='apply blocking migrations (implied by --drop)')
+    args = parser.parse_args()
+
+    result = init_database.lambda_handler({
+        'drop_existing': args.drop,
+        'allow_blocking_migrations': args.allow_blocking_migrations,
+        'insert_sample_data': False,
+        'synthetic_data': {
+            'customers': args.customers,
+            'products': args.products,
+            'orders': args.orders,
+            'seed': args.seed,
+            'days': args.days,
+            'end_date': args.end_date,
+            'zipf_s': args.zipf_s,
+            'chunk_size': args.chunk_size,
+            'prefix': args.prefix
+        }
+    }, None)
+    print(json.dumps(json.loads(result['body']), indent=2))
+
+
+if __name__ == '__main__':
+    main()
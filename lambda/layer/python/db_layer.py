@@ -0,0 +1,681 @@
+"""
+Shared database access for the LKS Lambda functions.
+
+Shipped in the Lambda layer (python/db_layer.py ends up on sys.path as
+/opt/python/db_layer.py). Owns the warm-container connection pool and the
+registry of named server-side prepared statements used on hot paths.
+"""
+import os
+import time
+import threading
+import psycopg2
+from psycopg2 import extensions
+
+# Environment variables
+DB_HOST = os.environ.get('DB_HOST')
+DB_NAME = os.environ.get('DB_NAME')
+DB_USER = os.environ.get('DB_USER')
+DB_PASSWORD = os.environ.get('DB_PASSWORD')
+
+# Read replica (optional), lihat get_db_connection(readonly=True)
+DB_READ_HOST = os.environ.get('DB_READ_HOST')
+DB_READ_MAX_LAG = float(os.environ.get('DB_READ_MAX_LAG', 30))
+DB_READ_RETRY_AFTER = int(os.environ.get('DB_READ_RETRY_AFTER', 30))
+# Lag replica dicek ulang saat checkout dari pool, paling sering tiap N detik
+DB_READ_LAG_CHECK_INTERVAL = float(os.environ.get('DB_READ_LAG_CHECK_INTERVAL', 5))
+
+# Connection pool settings
+DB_POOL_SIZE = int(os.environ.get('DB_POOL_SIZE', 2))
+DB_POOL_IDLE_TIMEOUT = int(os.environ.get('DB_POOL_IDLE_TIMEOUT', 300))
+DB_POOL_HEALTHCHECK_AFTER = int(os.environ.get('DB_POOL_HEALTHCHECK_AFTER', 30))
+DB_CONNECT_TIMEOUT = int(os.environ.get('DB_CONNECT_TIMEOUT', 5))
+
+# =====================================================
+# PREPARED STATEMENTS
+# =====================================================
+# Hot queries, prepared once per connection and then run with EXECUTE so
+# the server skips parse/plan on every call. Parameters use $n syntax.
+PREPARED_STATEMENTS = {
+    # order_management.create_order
+    'inventory_prices': """
+        SELECT product_id, price, product_name
+        FROM inventory
+        WHERE product_id = ANY($1::varchar[])
+    """,
+    'order_insert': """
+        INSERT INTO orders (order_id, customer_id, total_amount, status, created_at)
+        VALUES ($1, $2, $3, $4, $5)
+    """,
+
+    # order_management.get_order. orders / order_items are partitioned by
+    # created_at month; the created_at bounds let the executor prune.
+    'order_by_id_recent': """
+        SELECT order_id, customer_id, total_amount, status, created_at
+        FROM orders
+        WHERE order_id = $1
+          AND created_at >= LOCALTIMESTAMP - make_interval(days => $2::integer)
+    """,
+    'order_by_id': """
+        SELECT order_id, customer_id, total_amount, status, created_at
+        FROM orders
+        WHERE order_id = $1
+    """,
+    'order_items_by_order': """
+        SELECT product_id, quantity, price
+        FROM order_items
+        WHERE order_id = $1 AND created_at = $2
+    """,
+
+    # order_management.get_workflow_status
+    'order_execution_arn': """
+        SELECT execution_arn FROM order_executions WHERE order_id = $1
+    """,
+    'workflow_status_cached': """
+        SELECT result, is_terminal, EXTRACT(EPOCH FROM (now() - fetched_at))
+        FROM workflow_status_cache
+        WHERE execution_arn = $1
+    """,
+    'workflow_status_store': """
+        INSERT INTO workflow_status_cache (execution_arn, status, result, is_terminal, fetched_at)
+        VALUES ($1, $2, $3::jsonb, $4, now())
+        ON CONFLICT (execution_arn) DO UPDATE
+        SET status = EXCLUDED.status,
+            result = EXCLUDED.result,
+            is_terminal = EXCLUDED.is_terminal,
+            fetched_at = EXCLUDED.fetched_at
+        WHERE NOT workflow_status_cache.is_terminal
+    """,
+
+    # update_inventory
+    'order_items_with_product': """
+        SELECT oi.product_id, oi.quantity, i.product_name, i.price
+        FROM order_items oi
+        JOIN inventory i ON oi.product_id = i.product_id
+        WHERE oi.order_id = $1
+    """,
+    # Whole cart in one statement. `locked` takes the row locks sorted by
+    # product_id, so concurrent carts never wait on each other in opposite
+    # order. new_stock is NULL for products with insufficient stock.
+    'inventory_decrement_cart': """
+        WITH req AS (
+            SELECT * FROM unnest($1::varchar[], $2::integer[]) AS r(product_id, quantity)
+        ),
+        locked AS (
+            SELECT i.product_id, i.product_name, i.stock_quantity, i.category
+            FROM inventory i
+            JOIN req ON req.product_id = i.product_id
+            ORDER BY i.product_id
+            FOR UPDATE OF i
+        ),
+        updated AS (
+            UPDATE inventory i
+            SET stock_quantity = i.stock_quantity - req.quantity,
+                updated_at = $3
+            FROM req
+            JOIN locked l ON l.product_id = req.product_id
+            WHERE i.product_id = req.product_id
+              AND l.stock_quantity >= req.quantity
+            RETURNING i.product_id, i.stock_quantity AS new_stock
+        )
+        SELECT l.product_id, l.product_name, l.stock_quantity, req.quantity, u.new_stock, l.category
+        FROM locked l
+        JOIN req ON req.product_id = l.product_id
+        LEFT JOIN updated u ON u.product_id = l.product_id
+        ORDER BY l.product_id
+    """,
+    # update_inventory idempotency (inventory_applied_orders)
+    'inventory_applied_result': """
+        SELECT result FROM inventory_applied_orders WHERE order_id = $1
+    """,
+    'inventory_apply_claim': """
+        INSERT INTO inventory_applied_orders (order_id)
+        VALUES ($1)
+        ON CONFLICT (order_id) DO NOTHING
+        RETURNING order_id
+    """,
+    'inventory_apply_record': """
+        UPDATE inventory_applied_orders
+        SET result = $2::jsonb, applied_at = now()
+        WHERE order_id = $1
+    """,
+    'low_stock_alert_claim': """
+        INSERT INTO low_stock_alert_log (product_id, last_sent_at)
+        SELECT unnest($1::varchar[]), now()
+        ON CONFLICT (product_id) DO UPDATE
+        SET last_sent_at = EXCLUDED.last_sent_at
+        WHERE low_stock_alert_log.last_sent_at < now() - make_interval(secs => $2::integer)
+        RETURNING product_id
+    """,
+
+    # update_inventory hot SKU mode (inventory_stock_shards)
+    'stock_shards_hot_products': """
+        SELECT i.product_id, i.product_name, i.category
+        FROM inventory i
+        WHERE i.product_id = ANY($1::varchar[])
+          AND EXISTS (SELECT 1 FROM inventory_stock_shards s WHERE s.product_id = i.product_id)
+    """,
+    'stock_shard_take': """
+        UPDATE inventory_stock_shards s
+        SET quantity = s.quantity - $2::integer,
+            sold = s.sold + $2::integer,
+            updated_at = now()
+        WHERE (s.product_id, s.shard_no) = (
+            SELECT product_id, shard_no
+            FROM inventory_stock_shards
+            WHERE product_id = $1 AND quantity >= $2::integer
+            ORDER BY random()
+            LIMIT 1
+            FOR UPDATE SKIP LOCKED
+        )
+        RETURNING s.shard_no
+    """,
+    'stock_shards_available': """
+        SELECT COALESCE(SUM(quantity), 0)::integer
+        FROM inventory_stock_shards
+        WHERE product_id = $1
+    """,
+    'stock_shards_lock': """
+        SELECT shard_no, quantity
+        FROM inventory_stock_shards
+        WHERE product_id = $1
+        ORDER BY shard_no
+        FOR UPDATE
+    """,
+    'stock_shards_take_many': """
+        UPDATE inventory_stock_shards s
+        SET quantity = s.quantity - t.take,
+            sold = s.sold + t.take,
+            updated_at = now()
+        FROM unnest($2::smallint[], $3::integer[]) AS t(shard_no, take)
+        WHERE s.product_id = $1 AND s.shard_no = t.shard_no
+    """,
+    'stock_shards_lock_for_compaction': """
+        SELECT shard_no, sold
+        FROM inventory_stock_shards
+        WHERE product_id = $1
+        ORDER BY shard_no
+        FOR UPDATE
+    """,
+    'stock_shards_rebalance': """
+        UPDATE inventory_stock_shards s
+        SET quantity = t.quantity,
+            sold = 0,
+            updated_at = now()
+        FROM unnest($2::smallint[], $3::integer[]) AS t(shard_no, quantity)
+        WHERE s.product_id = $1 AND s.shard_no = t.shard_no
+    """,
+    'order_set_status': """
+        UPDATE orders
+        SET status = $1, updated_at = $2
+        WHERE order_id = $3
+    """,
+}
+
+
+def register_statement(name, sql):
+    """
+    Add a statement to the registry. Connections prepare it lazily on
+    first use.
+    """
+    PREPARED_STATEMENTS[name] = sql
+
+
+def execute_prepared(cur, name, params=()):
+    """
+    Run a registered statement on cur, preparing it on the cursor's
+    connection the first time it is used there. The connection must come
+    from get_db_connection (PooledConnection tracks what is prepared).
+    """
+    conn = cur.connection
+    prepared = getattr(conn, 'prepared_statements', None)
+    if prepared is None:
+        raise TypeError("execute_prepared needs a connection from get_db_connection")
+
+    if name not in prepared:
+        cur.execute(f"PREPARE {name} AS {PREPARED_STATEMENTS[name]}")
+        prepared.add(name)
+
+    if params:
+        placeholders = ', '.join(['%s'] * len(params))
+        cur.execute(f"EXECUTE {name} ({placeholders})", tuple(params))
+    else:
+        cur.execute(f"EXECUTE {name}")
+
+
+# =====================================================
+# CACHE VERSIONS
+# =====================================================
+# Each cache has a sequence <name>_version_seq. Writers bump it after
+# commit; sequences are non-transactional, so bumping never blocks
+# concurrent checkouts the way a shared version row would. Sequence
+# values are WAL-logged in batches of 32, so a standby does not see every
+# bump: read versions on the primary (get_primary_cache_version).
+
+def get_cache_version(cur, name):
+    """
+    Current version of a cache, or None when its sequence does not exist.
+    """
+    try:
+        cur.execute(f"SELECT last_value FROM {name}_version_seq")
+        return cur.fetchone()[0]
+    except psycopg2.Error as e:
+        print(f"Cache version {name} unavailable: {str(e)}")
+        cur.connection.rollback()
+        return None
+
+
+def get_primary_cache_version(name):
+    """
+    get_cache_version on a primary connection, for handlers whose other
+    queries run on the read replica.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        return get_cache_version(cur, name)
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+
+def bump_cache_version(conn, name):
+    """
+    Invalidate every cached entry of a cache. Call after the write commits.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute(f"SELECT nextval('{name}_version_seq')")
+        conn.commit()
+    except psycopg2.Error as e:
+        print(f"Could not bump cache version {name}: {str(e)}")
+        conn.rollback()
+    finally:
+        cur.close()
+
+
+# =====================================================
+# STOCK THRESHOLDS
+# =====================================================
+# stock_thresholds rows are keyed by product, by category or a single
+# default. init_database copies the resolved values into
+# inventory.alert_threshold / low_threshold (and the generated
+# stock_status column) for SQL paths; Python paths use the lookup below,
+# loaded once per warm container and reloaded when
+# stock_thresholds_version_seq moves.
+STOCK_THRESHOLDS_REFRESH = int(os.environ.get('STOCK_THRESHOLDS_REFRESH', 60))
+DEFAULT_ALERT_THRESHOLD = 10
+# <= 49 = < 50, batas Low/Normal report sebelum stock_thresholds
+DEFAULT_LOW_THRESHOLD = 49
+
+
+class StockThresholds:
+    """
+    Resolved stock thresholds: product override, then category, then the
+    default row. Stock at or below alert_threshold is 'Critical' (and
+    alerted on), at or below low_threshold 'Low', otherwise 'Normal'.
+    """
+    __slots__ = ('products', 'categories', 'default', 'version')
+
+    def __init__(self, rows=(), version=None):
+        self.products = {}
+        self.categories = {}
+        self.default = (DEFAULT_ALERT_THRESHOLD, DEFAULT_LOW_THRESHOLD)
+        self.version = version
+        for scope, scope_key, alert_threshold, low_threshold in rows:
+            if scope == 'product':
+                self.products[scope_key] = (alert_threshold, low_threshold)
+            elif scope == 'category':
+                self.categories[scope_key] = (alert_threshold, low_threshold)
+            else:
+                self.default = (alert_threshold, low_threshold)
+
+    def lookup(self, product_id, category=None):
+        """(alert_threshold, low_threshold) for a product."""
+        thresholds = self.products.get(product_id)
+        if thresholds is None and category is not None:
+            thresholds = self.categories.get(category)
+        return thresholds or self.default
+
+    def is_alert(self, product_id, stock, category=None):
+        return stock <= self.lookup(product_id, category)[0]
+
+    def status(self, product_id, stock, category=None):
+        alert_threshold, low_threshold = self.lookup(product_id, category)
+        if stock <= alert_threshold:
+            return 'Critical'
+        if stock <= low_threshold:
+            return 'Low'
+        return 'Normal'
+
+
+_stock_thresholds = None
+_stock_thresholds_checked_at = 0.0
+
+
+def get_stock_thresholds(cur):
+    """
+    Container-wide StockThresholds. At most one version check every
+    STOCK_THRESHOLDS_REFRESH seconds; the table itself is only read again
+    when its version changed. Call it outside an open transaction: a
+    missing table rolls the connection back and falls back to defaults.
+    """
+    global _stock_thresholds, _stock_thresholds_checked_at
+
+    now = time.time()
+    if _stock_thresholds is not None and now - _stock_thresholds_checked_at < STOCK_THRESHOLDS_REFRESH:
+        return _stock_thresholds
+
+    version = get_cache_version(cur, 'stock_thresholds')
+    if _stock_thresholds is None or version is None or version != _stock_thresholds.version:
+        try:
+            cur.execute("SELECT scope, scope_key, alert_threshold, low_threshold FROM stock_thresholds")
+            _stock_thresholds = StockThresholds(cur.fetchall(), version)
+        except psycopg2.Error as e:
+            print(f"Stock thresholds unavailable, using defaults: {str(e)}")
+            cur.connection.rollback()
+            _stock_thresholds = StockThresholds(version=version)
+
+    _stock_thresholds_checked_at = now
+    return _stock_thresholds
+
+
+# =====================================================
+# SCHEMA VERSION
+# =====================================================
+# init_database records every applied migration in schema_migrations.
+# Code paths that depend on an optional part of the schema check the
+# version instead of probing information_schema.
+SCHEMA_VERSION_TTL = int(os.environ.get('SCHEMA_VERSION_TTL', 300))
+
+# Fitur schema -> migration pertama yang membawanya
+SCHEMA_FEATURES = {
+    'inventory_category': 2,
+    'inventory_available': 17,
+}
+
+# Database yang dibuat sebelum ledger ada tidak punya schema_migrations,
+# fitur-nya dicek langsung di catalog
+SCHEMA_FEATURE_PROBES = {
+    'inventory_category': """
+        SELECT EXISTS (
+            SELECT 1 FROM information_schema.columns
+            WHERE table_name = 'inventory' AND column_name = 'category'
+        )
+    """,
+    'inventory_available': "SELECT to_regclass('inventory_available') IS NOT NULL",
+}
+
+_schema_version = None
+_schema_version_checked_at = 0.0
+# feature -> (present, checked_at), hanya dipakai tanpa ledger
+_schema_probes = {}
+
+
+def get_schema_version(cur):
+    """
+    Highest applied migration, cached per warm container for
+    SCHEMA_VERSION_TTL seconds. None when the ledger does not exist
+    (database initialised before it). Never raises on a missing ledger,
+    so the caller's transaction is left intact.
+    """
+    global _schema_version, _schema_version_checked_at
+
+    now = time.time()
+    if _schema_version_checked_at and now - _schema_version_checked_at < SCHEMA_VERSION_TTL:
+        return _schema_version
+
+    cur.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if cur.fetchone()[0]:
+        cur.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+        _schema_version = cur.fetchone()[0]
+    else:
+        _schema_version = None
+
+    _schema_version_checked_at = now
+    return _schema_version
+
+
+def schema_has(cur, feature):
+    """
+    Whether the migration that introduced a SCHEMA_FEATURES entry is
+    applied; without a ledger, the feature's catalog probe decides.
+    """
+    version = get_schema_version(cur)
+    if version is not None:
+        return version >= SCHEMA_FEATURES[feature]
+
+    now = time.time()
+    probe = _schema_probes.get(feature)
+    if probe and now - probe[1] < SCHEMA_VERSION_TTL:
+        return probe[0]
+
+    cur.execute(SCHEMA_FEATURE_PROBES[feature])
+    present = bool(cur.fetchone()[0])
+    _schema_probes[feature] = (present, now)
+    return present
+
+
+# =====================================================
+# CONNECTION POOL
+# =====================================================
+class PooledConnection(extensions.connection):
+    """psycopg2 connection that remembers which statements it has prepared."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.prepared_statements = set()
+        self.role = 'primary'
+        self.lag_checked_at = 0.0
+
+
+# Pool hidup selama container Lambda masih warm, satu per endpoint
+_pool_lock = threading.Lock()
+_idle_connections = {'primary': [], 'replica': []}  # role -> list of (connection, last_used_timestamp)
+_pool_stats = {'hits': 0, 'misses': 0, 'reconnects': 0, 'discarded': 0, 'replica': 0, 'replica_fallbacks': 0}
+# Replica yang gagal / tertinggal tidak dipakai sampai waktu ini
+_replica_down_until = 0.0
+
+
+def _open_connection(role='primary'):
+    conn = psycopg2.connect(
+        host=DB_READ_HOST if role == 'replica' else DB_HOST,
+        database=DB_NAME,
+        user=DB_USER,
+        password=DB_PASSWORD,
+        connect_timeout=DB_CONNECT_TIMEOUT,
+        keepalives=1,
+        keepalives_idle=30,
+        connection_factory=PooledConnection
+    )
+    conn.role = role
+    if role == 'replica':
+        conn.set_session(readonly=True)
+    return conn
+
+
+def _close_quietly(conn):
+    try:
+        conn.close()
+    except Exception:
+        pass
+
+
+def _is_healthy(conn, idle_seconds):
+    """
+    Cheap health check. Only round-trips to the server when the
+    connection has been idle long enough to have been dropped
+    (e.g. after an RDS failover or NAT timeout).
+    """
+    if conn.closed:
+        return False
+    if idle_seconds < DB_POOL_HEALTHCHECK_AFTER:
+        return True
+    try:
+        cur = conn.cursor()
+        cur.execute("SELECT 1")
+        cur.fetchone()
+        cur.close()
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+
+def _replica_lag_ok(conn):
+    """
+    Replication lag check for a replica connection, run when it is opened
+    and again on checkout once DB_READ_LAG_CHECK_INTERVAL has passed. A
+    primary (pg_is_in_recovery() false) counts as zero lag.
+    """
+    try:
+        cur = conn.cursor()
+        cur.execute("""
+            SELECT CASE WHEN pg_is_in_recovery()
+                THEN COALESCE(EXTRACT(EPOCH FROM (now() - pg_last_xact_replay_timestamp())), 0)
+                ELSE 0 END
+        """)
+        lag = float(cur.fetchone()[0])
+        cur.close()
+        conn.rollback()
+    except psycopg2.Error as e:
+        print(f"Replica lag check failed: {str(e)}")
+        return False
+    if lag > DB_READ_MAX_LAG:
+        print(f"Replica lag {lag:.1f}s exceeds {DB_READ_MAX_LAG}s")
+        return False
+    conn.lag_checked_at = time.time()
+    return True
+
+
+def _mark_replica_down():
+    global _replica_down_until
+    with _pool_lock:
+        _replica_down_until = time.time() + DB_READ_RETRY_AFTER
+        _pool_stats['replica_fallbacks'] += 1
+        stale = _idle_connections['replica'][:]
+        _idle_connections['replica'].clear()
+    for conn, _ in stale:
+        _close_quietly(conn)
+
+
+def _get_replica_connection():
+    """
+    Pooled replica connection, or None when the replica is unavailable
+    (the caller then uses the primary).
+    """
+    with _pool_lock:
+        if time.time() < _replica_down_until:
+            return None
+
+    conn = _checkout('replica')
+    if conn is None:
+        try:
+            conn = _open_connection('replica')
+        except psycopg2.OperationalError as e:
+            print(f"Replica connection failed, using primary: {str(e)}")
+            _mark_replica_down()
+            return None
+
+    # Koneksi pooled bisa dipakai ulang lama; replica bisa tertinggal sejak dibuka
+    if time.time() - conn.lag_checked_at >= DB_READ_LAG_CHECK_INTERVAL and not _replica_lag_ok(conn):
+        _close_quietly(conn)
+        _mark_replica_down()
+        return None
+
+    with _pool_lock:
+        _pool_stats['replica'] += 1
+    return conn
+
+
+def _checkout(role):
+    """Healthy idle connection of the given role, or None."""
+    while True:
+        with _pool_lock:
+            if not _idle_connections[role]:
+                _pool_stats['misses'] += 1
+                return None
+            conn, last_used = _idle_connections[role].pop()
+
+        idle_seconds = time.time() - last_used
+        if idle_seconds > DB_POOL_IDLE_TIMEOUT or not _is_healthy(conn, idle_seconds):
+            print(f"Discarding pooled {role} connection (idle {idle_seconds:.0f}s)")
+            _close_quietly(conn)
+            with _pool_lock:
+                _pool_stats['discarded'] += 1
+            continue
+
+        with _pool_lock:
+            _pool_stats['hits'] += 1
+        return conn
+
+
+def get_db_connection(readonly=False):
+    """
+    Take a connection from the warm-container pool, or open a new one
+    when the pool is empty. Return it with release_db_connection().
+
+    readonly=True routes to DB_READ_HOST when it is configured and
+    healthy; the replica may lag the primary by up to DB_READ_MAX_LAG
+    seconds, so callers that must see their own writes use the default.
+    """
+    if readonly and DB_READ_HOST:
+        conn = _get_replica_connection()
+        if conn is not None:
+            return conn
+
+    conn = _checkout('primary')
+    if conn is not None:
+        return conn
+
+    try:
+        return _open_connection()
+    except psycopg2.OperationalError as e:
+        # Endpoint bisa sedang failover, coba sekali lagi
+        print(f"Connection failed, retrying once: {str(e)}")
+        with _pool_lock:
+            _pool_stats['reconnects'] += 1
+        time.sleep(0.5)
+        return _open_connection()
+
+
+def release_db_connection(conn):
+    """
+    Return a connection to the pool. Any open transaction is rolled back;
+    broken connections and connections beyond DB_POOL_SIZE are closed.
+    """
+    if conn is None:
+        return
+    if conn.closed:
+        # Replica putus di tengah request: arahkan read ke primary dulu
+        if getattr(conn, 'role', 'primary') == 'replica':
+            _mark_replica_down()
+        return
+
+    try:
+        if conn.autocommit:
+            conn.autocommit = False
+        elif conn.get_transaction_status() != extensions.TRANSACTION_STATUS_IDLE:
+            conn.rollback()
+    except psycopg2.Error:
+        _close_quietly(conn)
+        with _pool_lock:
+            _pool_stats['discarded'] += 1
+        return
+
+    role = getattr(conn, 'role', 'primary')
+    with _pool_lock:
+        if len(_idle_connections[role]) < DB_POOL_SIZE:
+            _idle_connections[role].append((conn, time.time()))
+            return
+        _pool_stats['discarded'] += 1
+    _close_quietly(conn)
+
+
+def get_pool_stats():
+    with _pool_lock:
+        stats = dict(_pool_stats)
+        stats['idle'] = len(_idle_connections['primary'])
+        stats['idle_replica'] = len(_idle_connections['replica'])
+        stats['replica_available'] = bool(DB_READ_HOST) and time.time() >= _replica_down_until
+    stats['size'] = DB_POOL_SIZE
+    return stats
@@ -1,39 +1,112 @@
 import json
 import os
+import base64
+import hashlib
+import time
 import boto3
-import psycopg2
-from datetime import datetime
+from datetime import datetime, timezone
 import uuid
+from concurrent.futures import ThreadPoolExecutor
+from psycopg2 import errors
+from psycopg2.extras import execute_values
+
+from db_layer import (
+    get_db_connection,
+    release_db_connection,
+    execute_prepared,
+    get_pool_stats,
+    get_primary_cache_version,
+    schema_has
+)
 
 # Environment variables
-DB_HOST = os.environ['DB_HOST']
-DB_NAME = os.environ['DB_NAME']
-DB_USER = os.environ['DB_USER']
-DB_PASSWORD = os.environ['DB_PASSWORD']
 S3_BUCKET = os.environ['S3_BUCKET']
 STATE_MACHINE_ARN = os.environ['STATE_MACHINE_ARN']
 
+# Batch ingestion settings
+BATCH_MAX_ORDERS = int(os.environ.get('BATCH_MAX_ORDERS', 500))
+BATCH_ARCHIVE_CHUNK = int(os.environ.get('BATCH_ARCHIVE_CHUNK', 1000))
+WORKFLOW_START_CONCURRENCY = int(os.environ.get('WORKFLOW_START_CONCURRENCY', 10))
+
+# Di atas jumlah ini GET /orders memakai estimasi pg_class.reltuples
+ORDER_COUNT_EXACT_THRESHOLD = int(os.environ.get('ORDER_COUNT_EXACT_THRESHOLD', 10000))
+
+# GET /orders/{id} mencari di partisi N hari terakhir dulu sebelum semua partisi
+ORDER_LOOKUP_RECENT_DAYS = int(os.environ.get('ORDER_LOOKUP_RECENT_DAYS', 31))
+
+# Workflow status cache
+WORKFLOW_STATUS_TTL = int(os.environ.get('WORKFLOW_STATUS_TTL', 5))
+WORKFLOW_STATUS_CACHE_MAX = int(os.environ.get('WORKFLOW_STATUS_CACHE_MAX', 1000))
+TERMINAL_EXECUTION_STATUSES = ('SUCCEEDED', 'FAILED', 'TIMED_OUT', 'ABORTED')
+
+# Browser boleh pakai /products dan /customers dari cache selama ini (detik)
+CATALOG_CACHE_MAX_AGE = int(os.environ.get('CATALOG_CACHE_MAX_AGE', 60))
+
+# In-process catalog cache untuk list_products
+CATALOG_CACHE_TTL = int(os.environ.get('CATALOG_CACHE_TTL', 30))
+CATALOG_CACHE_MAX_ENTRIES = int(os.environ.get('CATALOG_CACHE_MAX_ENTRIES', 64))
+
+# Log statistik pool DB di akhir setiap invocation (debug saja)
+DB_POOL_STATS_LOG = os.environ.get('DB_POOL_STATS_LOG', 'false').lower() == 'true'
+
+# Batas halaman Step Functions yang di-scan per request GET /executions
+EXECUTIONS_MAX_PAGES = int(os.environ.get('EXECUTIONS_MAX_PAGES', 10))
+
+# Lock wait saat partisi bulan order dibuat on demand (lihat insert_with_partition)
+PARTITION_LOCK_TIMEOUT_MS = int(os.environ.get('PARTITION_LOCK_TIMEOUT_MS', 5000))
+
 s3_client = boto3.client('s3')
 sfn_client = boto3.client('stepfunctions')
 
-def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+# execution_arn -> (result_data, expires_at); expires_at None = terminal
+_workflow_status_cache = {}
 
-def response(status_code, body):
+# (category_filter, in_stock_only) -> (catalog_version, expires_at, (has_category, products))
+_catalog_cache = {}
+_catalog_cache_stats = {'hits': 0, 'misses': 0}
+
+def response(status_code, body, headers=None):
+    response_headers = {
+        'Content-Type': 'application/json',
+        'Access-Control-Allow-Origin': '*',
+        'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key,If-None-Match',
+        'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS',
+        'Access-Control-Expose-Headers': 'ETag'
+    }
+    if headers:
+        response_headers.update(headers)
+    
     return {
         'statusCode': status_code,
-        'headers': {
-            'Content-Type': 'application/json',
-            'Access-Control-Allow-Origin': '*',
-            'Access-Control-Allow-Headers': 'Content-Type,X-Amz-Date,Authorization,X-Api-Key',
-            'Access-Control-Allow-Methods': 'GET,POST,PUT,DELETE,OPTIONS'
-        },
-        'body': json.dumps(body)
+        'headers': response_headers,
+        'body': json.dumps(body) if body is not None else ''
+    }
+
+def compute_etag(table, version, *variant):
+    """
+    Weak ETag from a cache version sequence (no table scan), mixed with the
+    request variant (filters). None when the version is unavailable.
+    """
+    if version is None:
+        return None
+    stamp = json.dumps([table, version, variant])
+    return 'W/"' + hashlib.md5(stamp.encode()).hexdigest() + '"'
+
+def etag_matches(event, etag):
+    if etag is None:
+        return False
+    headers = event.get('headers') or {}
+    for name, value in headers.items():
+        if name.lower() == 'if-none-match' and value:
+            return etag in [tag.strip() for tag in value.split(',')] or value.strip() == '*'
+    return False
+
+def catalog_headers(etag):
+    if etag is None:
+        return {'Cache-Control': 'no-cache'}
+    return {
+        'ETag': etag,
+        'Cache-Control': f'private, max-age={CATALOG_CACHE_MAX_AGE}, must-revalidate'
     }
 
 def list_customers(event):
@@ -41,7 +114,13 @@ def list_customers(event):
     GET /customers
     Returns list of all customers for dropdown
     """
-    conn = get_db_connection()
+    # customers_version_seq digerakkan trigger (migration 18), dibaca di primary.
+    # 304 dijawab sebelum connection replica diambil
+    etag = compute_etag('customers', get_primary_cache_version('customers'))
+    if etag_matches(event, etag):
+        return response(304, None, headers=catalog_headers(etag))
+    
+    conn = get_db_connection(readonly=True)
     cur = conn.cursor()
     
     try:
@@ -61,99 +140,145 @@ def list_customers(event):
                 'address': row[4]
             })
         
-        return response(200, {'customers': customers})
+        return response(200, {'customers': customers}, headers=catalog_headers(etag))
         
     except Exception as e:
         print(f"Error listing customers: {str(e)}")
         return response(500, {'message': 'Failed to list customers', 'error': str(e)})
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
+
+def query_products(cur, has_category, category_filter, in_stock_only, source='inventory'):
+    # Build query dynamically berdasarkan kolom yang ada. source = inventory_available
+    # (stok dikurangi penjualan lewat shard hot SKU) kalau view-nya sudah ada
+    if has_category:
+        query = f"""
+            SELECT product_id, product_name, price, stock_quantity, 
+                   COALESCE(description, '') as description,
+                   COALESCE(category, '') as category
+            FROM {source}
+            WHERE 1=1
+        """
+    else:
+        query = f"""
+            SELECT product_id, product_name, price, stock_quantity, 
+                   COALESCE(description, '') as description,
+                   '' as category
+            FROM {source}
+            WHERE 1=1
+        """
+    
+    params = []
+    
+    if in_stock_only:
+        query += " AND stock_quantity > 0"
+    
+    if category_filter and has_category:
+        query += " AND category = %s"
+        params.append(category_filter)
+    
+    query += " ORDER BY product_name"
+    
+    print(f"Executing query: {query}")
+    print(f"With params: {params}")
+    
+    cur.execute(query, params)
+    
+    products = []
+    for row in cur.fetchall():
+        products.append({
+            'product_id': row[0],
+            'product_name': row[1],
+            'price': float(row[2]),
+            'stock_quantity': row[3],
+            'description': row[4],
+            'category': row[5] if has_category else ''
+        })
+    return products
+
+def get_cached_products(cache_key, catalog_version):
+    """
+    (has_category, products) from the warm-container cache, or None on a miss.
+    Entries are invalid once the catalog version moves or the TTL expires;
+    without a version (sequence missing) nothing is cached.
+    """
+    entry = _catalog_cache.pop(cache_key, None)
+    if entry and catalog_version is not None and entry[0] == catalog_version and entry[1] > time.time():
+        _catalog_cache[cache_key] = entry  # re-insert = most recently used
+        _catalog_cache_stats['hits'] += 1
+        return entry[2]
+    
+    _catalog_cache_stats['misses'] += 1
+    return None
+
+def store_cached_products(cache_key, catalog_version, products):
+    if catalog_version is None:
+        return
+    while len(_catalog_cache) >= CATALOG_CACHE_MAX_ENTRIES:
+        _catalog_cache.pop(next(iter(_catalog_cache)))
+    _catalog_cache[cache_key] = (catalog_version, time.time() + CATALOG_CACHE_TTL, products)
+
+def catalog_cache_metadata(cache_hit, catalog_version):
+    lookups = _catalog_cache_stats['hits'] + _catalog_cache_stats['misses']
+    return {
+        'hit': cache_hit,
+        'version': catalog_version,
+        'hits': _catalog_cache_stats['hits'],
+        'misses': _catalog_cache_stats['misses'],
+        'hit_rate': round(_catalog_cache_stats['hits'] / lookups, 3) if lookups else 0.0,
+        'entries': len(_catalog_cache)
+    }
 
 def list_products(event):
     """
     GET /products
     Returns list of all products from inventory for dropdown
     """
-    conn = get_db_connection()
-    cur = conn.cursor()
+    # Get query parameters for filtering
+    query_params = event.get('queryStringParameters', {}) or {}
+    category_filter = query_params.get('category')
+    in_stock_only = query_params.get('in_stock', 'true').lower() == 'true'
     
     try:
-        # Pertama, cek apakah kolom category ada
-        cur.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name = 'inventory' 
-            AND column_name = 'category'
-        """)
-        has_category = cur.fetchone() is not None
-        
-        print(f"Database has category column: {has_category}")
-        
-        # Get query parameters for filtering
-        query_params = event.get('queryStringParameters', {}) or {}
-        category_filter = query_params.get('category')
-        in_stock_only = query_params.get('in_stock', 'true').lower() == 'true'
-        
-        # Build query dynamically berdasarkan kolom yang ada
-        if has_category:
-            query = """
-                SELECT product_id, product_name, price, stock_quantity, 
-                       COALESCE(description, '') as description,
-                       COALESCE(category, '') as category
-                FROM inventory
-                WHERE 1=1
-            """
+        # Versi catalog dibaca sekali, paling awal, di primary (standby tidak
+        # melihat setiap nextval). 304 dan cache hit tidak menyentuh inventory
+        catalog_version = get_primary_cache_version('catalog')
+        etag = compute_etag('inventory', catalog_version, category_filter, in_stock_only)
+        if etag_matches(event, etag):
+            return response(304, None, headers=catalog_headers(etag))
+        
+        # Cache per filter, valid selama versi catalog sama dan TTL belum habis
+        cache_key = (category_filter, in_stock_only)
+        cached = get_cached_products(cache_key, catalog_version)
+        cache_hit = cached is not None
+        
+        if cache_hit:
+            has_category, products = cached
         else:
-            query = """
-                SELECT product_id, product_name, price, stock_quantity, 
-                       COALESCE(description, '') as description,
-                       '' as category
-                FROM inventory
-                WHERE 1=1
-            """
-        
-        params = []
-        
-        if in_stock_only:
-            query += " AND stock_quantity > 0"
-        
-        if category_filter and has_category:
-            query += " AND category = %s"
-            params.append(category_filter)
-        
-        query += " ORDER BY product_name"
-        
-        print(f"Executing query: {query}")
-        print(f"With params: {params}")
-        
-        cur.execute(query, params)
-        
-        products = []
-        for row in cur.fetchall():
-            product = {
-                'product_id': row[0],
-                'product_name': row[1],
-                'price': float(row[2]),
-                'stock_quantity': row[3],
-                'description': row[4],
-                'category': row[5] if has_category else ''
-            }
-            products.append(product)
-        
-        print(f"Found {len(products)} products")
+            conn = get_db_connection(readonly=True)
+            cur = conn.cursor()
+            try:
+                has_category = schema_has(cur, 'inventory_category')
+                source = 'inventory_available' if schema_has(cur, 'inventory_available') else 'inventory'
+                products = query_products(cur, has_category, category_filter, in_stock_only, source)
+            finally:
+                cur.close()
+                release_db_connection(conn)
+            store_cached_products(cache_key, catalog_version, (has_category, products))
         
         return response(200, {
             'products': products,
             'count': len(products),
             'metadata': {
                 'has_category_column': has_category,
+                'cache': catalog_cache_metadata(cache_hit, catalog_version),
                 'filters_applied': {
                     'category': category_filter,
                     'in_stock_only': in_stock_only
                 }
             }
-        })
+        }, headers=catalog_headers(etag))
         
     except Exception as e:
         print(f"Error listing products: {str(e)}")
@@ -164,9 +289,6 @@ def list_products(event):
             'error': str(e),
             'hint': 'Check if inventory table exists and has required columns'
         })
-    finally:
-        cur.close()
-        conn.close()
 
 def get_product(product_id):
     """
@@ -176,9 +298,10 @@ def get_product(product_id):
     cur = conn.cursor()
     
     try:
-        cur.execute("""
+        source = 'inventory_available' if schema_has(cur, 'inventory_available') else 'inventory'
+        cur.execute(f"""
             SELECT product_id, product_name, price, stock_quantity, description
-            FROM inventory
+            FROM {source}
             WHERE product_id = %s AND stock_quantity > 0
         """, (product_id,))
         
@@ -199,50 +322,110 @@ def get_product(product_id):
         return None
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
 
-def create_order(event):
-    body = json.loads(event['body'])
-    
+def fetch_prices(cur, product_ids):
+    """
+    Price lookup for a whole cart in one round-trip.
+    Returns {product_id: (price, product_name)}; unknown IDs are absent.
+    """
+    execute_prepared(cur, 'inventory_prices', (list(set(product_ids)),))
+    return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+def validate_order_payload(body):
+    """
+    Validate a create-order payload.
+    Returns an error message, or None when the payload is valid.
+    """
     # Validate required fields
     required_fields = ['customer_id', 'items']
     for field in required_fields:
         if field not in body:
-            return response(400, {'message': f'Missing required field: {field}'})
+            return f'Missing required field: {field}'
     
     # Additional validation
     customer_id = body['customer_id']
     items = body['items']
     
     if not isinstance(customer_id, str) or not customer_id.strip():
-        return response(400, {'message': 'customer_id must be a non-empty string'})
+        return 'customer_id must be a non-empty string'
     
     if not isinstance(items, list) or len(items) == 0:
-        return response(400, {'message': 'items must be a non-empty list'})
+        return 'items must be a non-empty list'
     
     # Validate each item
     for i, item in enumerate(items):
         if 'product_id' not in item or 'quantity' not in item:
-            return response(400, {'message': f'Item {i} missing product_id or quantity'})
+            return f'Item {i} missing product_id or quantity'
         if item['quantity'] <= 0:
-            return response(400, {'message': f'Item {i} quantity must be positive'})
+            return f'Item {i} quantity must be positive'
+    
+    return None
+
+def ensure_order_partition(conn, created_at):
+    """
+    Create the orders / order_items partitions for created_at's month.
+    Uses the advisory lock init_database maintenance also takes, so two
+    creators never race on the same CREATE TABLE ... PARTITION OF.
+    """
+    cur = conn.cursor()
+    try:
+        cur.execute("SET LOCAL lock_timeout = %s", (PARTITION_LOCK_TIMEOUT_MS,))
+        cur.execute("SELECT pg_advisory_xact_lock(hashtext('create_order_partitions'))")
+        cur.execute("SELECT create_order_partitions(%s::date, %s::date)", (created_at, created_at))
+        created = cur.fetchone()[0]
+        conn.commit()
+        return created
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+
+def insert_with_partition(conn, cur, created_at, insert):
+    """
+    Run insert(cur). When created_at's month has no partition yet (the
+    maintenance schedule lapsed), roll back, create the month and retry
+    once. Everything insert() writes must be in that month.
+    """
+    try:
+        insert(cur)
+    except errors.CheckViolation as e:
+        if 'no partition of relation' not in str(e):
+            raise
+        conn.rollback()
+        print(f"No order partition for {created_at:%Y-%m}, creating it on demand")
+        ensure_order_partition(conn, created_at)
+        insert(cur)
+
+def create_order(event):
+    body = json.loads(event['body'])
+    
+    validation_error = validate_order_payload(body)
+    if validation_error:
+        return response(400, {'message': validation_error})
+    
+    customer_id = body['customer_id']
+    items = body['items']
     
     order_id = str(uuid.uuid4())
+    created_at = datetime.now()
     
     conn = get_db_connection()
     cur = conn.cursor()
     
     try:
-        # Calculate total amount
+        # Calculate total amount - semua harga diambil dalam satu query
+        prices = fetch_prices(cur, [item['product_id'] for item in items])
+        
         total_amount = 0
         item_details = []
+        item_rows = []
         for item in items:
-            cur.execute("SELECT price, product_name FROM inventory WHERE product_id = %s", (item['product_id'],))
-            result = cur.fetchone()
-            if not result:
+            if item['product_id'] not in prices:
                 return response(400, {'message': f"Product {item['product_id']} not found"})
             
-            price, product_name = result
+            price, product_name = prices[item['product_id']]
             item_total = price * item['quantity']
             total_amount += item_total
             
@@ -253,20 +436,20 @@ def create_order(event):
                 'quantity': item['quantity'],
                 'price': float(price)
             })
+            item_rows.append((order_id, item['product_id'], item['quantity'], price, created_at))
         
-        # Insert order
-        cur.execute("""
-            INSERT INTO orders (order_id, customer_id, total_amount, status, created_at)
-            VALUES (%s, %s, %s, %s, %s)
-        """, (order_id, customer_id, total_amount, 'pending', datetime.now()))
-        
-        # Insert order items
-        for item in items:
-            cur.execute("""
-                INSERT INTO order_items (order_id, product_id, quantity, price)
-                SELECT %s, %s, %s, price FROM inventory WHERE product_id = %s
-            """, (order_id, item['product_id'], item['quantity'], item['product_id']))
-        
+        def insert_order(cur):
+            # Insert order
+            execute_prepared(cur, 'order_insert', (order_id, customer_id, total_amount, 'pending', created_at))
+            
+            # Insert order items (multi-row, satu round-trip). created_at = created_at
+            # order, item masuk partisi bulan yang sama dengan order-nya
+            execute_values(cur, """
+                INSERT INTO order_items (order_id, product_id, quantity, price, created_at)
+                VALUES %s
+            """, item_rows, page_size=1000)
+        
+        insert_with_partition(conn, cur, created_at, insert_order)
         conn.commit()
         
         # Save order to S3
@@ -279,7 +462,7 @@ def create_order(event):
                 'customer_id': customer_id,
                 'items': items,
                 'total_amount': float(total_amount),
-                'created_at': datetime.now().isoformat()
+                'created_at': created_at.isoformat()
             })
         )
 
@@ -316,6 +499,8 @@ def create_order(event):
         execution_arn = execution_response['executionArn']
         print(f"Execution started: {execution_arn}")
         
+        save_execution_arns(conn, [(order_id, execution_arn)])
+        
         return response(201, {
             'message': 'Order created successfully',
             'order_id': order_id,
@@ -346,27 +531,422 @@ def create_order(event):
             })
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
+
+def save_execution_arns(conn, pairs):
+    """
+    Persist (order_id, execution_arn) pairs so status lookups by order ID
+    are a single indexed read. Failures are logged, never raised: the
+    order itself is already committed.
+    """
+    cur = conn.cursor()
+    try:
+        execute_values(cur, """
+            INSERT INTO order_executions (order_id, execution_arn)
+            VALUES %s
+            ON CONFLICT (order_id) DO UPDATE SET execution_arn = EXCLUDED.execution_arn
+        """, pairs, page_size=1000)
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error saving execution ARNs: {str(e)}")
+    finally:
+        cur.close()
+
+def find_execution_arn(order_id):
+    """
+    Look up the execution ARN for an order in order_executions.
+    Returns None when the order has no recorded execution.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        execute_prepared(cur, 'order_execution_arn', (order_id,))
+        row = cur.fetchone()
+        return row[0] if row else None
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+def backfill_order_executions(event):
+    """
+    Backfill order_executions from Step Functions history for orders created
+    before execution ARNs were persisted. Invoke directly with
+    {"action": "backfill_order_executions"}; resumable via next_token.
+    """
+    max_pages = int(event.get('max_pages', 50))
+    next_token = event.get('next_token')
+    pages = 0
+    matched = 0
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        while pages < max_pages:
+            kwargs = {'stateMachineArn': STATE_MACHINE_ARN, 'maxResults': 1000}
+            if next_token:
+                kwargs['nextToken'] = next_token
+            page = sfn_client.list_executions(**kwargs)
+            pages += 1
+            
+            pairs = []
+            for execution in page.get('executions', []):
+                name = execution.get('name', '')
+                if name.startswith('order-'):
+                    pairs.append((name[len('order-'):], execution['executionArn']))
+            
+            if pairs:
+                # Hanya order yang masih ada di tabel orders
+                execute_values(cur, """
+                    INSERT INTO order_executions (order_id, execution_arn)
+                    SELECT v.order_id, v.execution_arn
+                    FROM (VALUES %s) AS v(order_id, execution_arn)
+                    JOIN orders o ON o.order_id = v.order_id
+                    ON CONFLICT (order_id) DO NOTHING
+                """, pairs, page_size=1000)
+                matched += cur.rowcount
+                conn.commit()
+            
+            next_token = page.get('nextToken')
+            if not next_token:
+                break
+        
+        print(f"Backfill done: {pages} pages, {matched} executions recorded")
+        return {
+            'status': 'complete' if not next_token else 'partial',
+            'pages_scanned': pages,
+            'executions_recorded': matched,
+            'next_token': next_token
+        }
+    except Exception as e:
+        conn.rollback()
+        print(f"Error in backfill_order_executions: {str(e)}")
+        return {
+            'status': 'failed',
+            'message': str(e),
+            'pages_scanned': pages,
+            'next_token': next_token
+        }
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+def start_order_workflow(order_id, customer_id, total_amount, item_details):
+    """
+    Start the order Step Functions execution. Returns the execution ARN.
+    """
+    step_functions_input = {
+        'orderId': order_id,
+        'customerId': customer_id,
+        'totalAmount': float(total_amount),
+        'items': item_details,
+        'timestamp': datetime.now().isoformat()
+    }
+    
+    execution_response = sfn_client.start_execution(
+        stateMachineArn=STATE_MACHINE_ARN,
+        name=f"order-{order_id}",
+        input=json.dumps(step_functions_input)
+    )
+    return execution_response['executionArn']
+
+def create_orders_batch(event):
+    """
+    POST /orders/batch
+    Create many orders in one call: one DB transaction with bulk inserts,
+    NDJSON archive in S3, and workflows started through a bounded thread pool.
+    Returns per-order results; invalid orders are reported, not fatal.
+    """
+    body = json.loads(event['body'])
+    orders = body.get('orders')
+    
+    if not isinstance(orders, list) or len(orders) == 0:
+        return response(400, {'message': 'orders must be a non-empty list'})
+    
+    if len(orders) > BATCH_MAX_ORDERS:
+        return response(400, {'message': f'Batch too large, maximum {BATCH_MAX_ORDERS} orders'})
+    
+    if 'execution' in STATE_MACHINE_ARN:
+        return response(400, {
+            'message': 'Invalid State Machine ARN configuration',
+            'error': 'ARN appears to be an execution ARN, not a state machine ARN'
+        })
+    
+    batch_id = str(uuid.uuid4())
+    results = [None] * len(orders)
+    
+    # Validasi per order - order yang invalid tidak menggagalkan batch
+    pending = []
+    for index, order in enumerate(orders):
+        try:
+            validation_error = validate_order_payload(order) if isinstance(order, dict) else 'Order must be an object'
+        except Exception as e:
+            validation_error = f'Invalid order payload: {str(e)}'
+        
+        if validation_error:
+            results[index] = {'index': index, 'status': 'failed', 'error': validation_error}
+        else:
+            pending.append(index)
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    
+    try:
+        # Harga dan customer untuk seluruh batch dalam dua query
+        prices = fetch_prices(cur, [
+            item['product_id'] for index in pending for item in orders[index]['items']
+        ])
+        
+        cur.execute(
+            "SELECT customer_id FROM customers WHERE customer_id = ANY(%s)",
+            (list({orders[index]['customer_id'] for index in pending}),)
+        )
+        known_customers = {row[0] for row in cur.fetchall()}
+        
+        created_at = datetime.now()
+        order_rows = []
+        item_rows = []
+        created = []
+        
+        for index in pending:
+            order = orders[index]
+            customer_id = order['customer_id']
+            
+            if customer_id not in known_customers:
+                results[index] = {'index': index, 'status': 'failed', 'error': f'Customer {customer_id} not found'}
+                continue
+            
+            missing = [item['product_id'] for item in order['items'] if item['product_id'] not in prices]
+            if missing:
+                results[index] = {'index': index, 'status': 'failed', 'error': f'Product {missing[0]} not found'}
+                continue
+            
+            order_id = str(uuid.uuid4())
+            total_amount = 0
+            item_details = []
+            for item in order['items']:
+                price, product_name = prices[item['product_id']]
+                total_amount += price * item['quantity']
+                item_details.append({
+                    'productId': item['product_id'],
+                    'productName': product_name,
+                    'quantity': item['quantity'],
+                    'price': float(price)
+                })
+                item_rows.append((order_id, item['product_id'], item['quantity'], price, created_at))
+            
+            order_rows.append((order_id, customer_id, total_amount, 'pending', created_at))
+            created.append({
+                'index': index,
+                'order_id': order_id,
+                'customer_id': customer_id,
+                'items': order['items'],
+                'item_details': item_details,
+                'total_amount': total_amount
+            })
+        
+        def insert_batch(cur):
+            execute_values(cur, """
+                INSERT INTO orders (order_id, customer_id, total_amount, status, created_at)
+                VALUES %s
+            """, order_rows, page_size=1000)
+            execute_values(cur, """
+                INSERT INTO order_items (order_id, product_id, quantity, price, created_at)
+                VALUES %s
+            """, item_rows, page_size=1000)
+        
+        # Satu created_at untuk seluruh batch, jadi cukup satu partisi bulan
+        if order_rows:
+            insert_with_partition(conn, cur, created_at, insert_batch)
+        
+        conn.commit()
+        
+    except Exception as e:
+        conn.rollback()
+        print(f"Error in create_orders_batch: {str(e)}")
+        import traceback
+        traceback.print_exc()
+        return response(500, {
+            'message': 'Failed to create order batch',
+            'batch_id': batch_id,
+            'error': str(e)
+        })
+    finally:
+        cur.close()
+        release_db_connection(conn)
+    
+    # Archive ke S3 sebagai NDJSON, beberapa order per object
+    archive_keys = []
+    for part, start in enumerate(range(0, len(created), BATCH_ARCHIVE_CHUNK)):
+        chunk = created[start:start + BATCH_ARCHIVE_CHUNK]
+        s3_key = f"orders/batch/{batch_id}/part-{part:04d}.ndjson"
+        try:
+            s3_client.put_object(
+                Bucket=S3_BUCKET,
+                Key=s3_key,
+                Body='\n'.join(json.dumps({
+                    'order_id': entry['order_id'],
+                    'customer_id': entry['customer_id'],
+                    'items': entry['items'],
+                    'total_amount': float(entry['total_amount']),
+                    'created_at': created_at.isoformat()
+                }) for entry in chunk) + '\n',
+                ContentType='application/x-ndjson'
+            )
+            archive_keys.append(s3_key)
+        except Exception as e:
+            print(f"Error archiving batch part {part}: {str(e)}")
+    
+    # Start workflow secara paralel dengan jumlah thread terbatas
+    def start(entry):
+        try:
+            execution_arn = start_order_workflow(
+                entry['order_id'], entry['customer_id'], entry['total_amount'], entry['item_details']
+            )
+            return {'index': entry['index'], 'status': 'created', 'order_id': entry['order_id'], 'execution_arn': execution_arn}
+        except Exception as e:
+            print(f"Error starting workflow for order {entry['order_id']}: {str(e)}")
+            return {
+                'index': entry['index'],
+                'status': 'workflow_failed',
+                'order_id': entry['order_id'],
+                'error': str(e),
+                'note': 'Order was saved to database and S3 successfully'
+            }
+    
+    if created:
+        with ThreadPoolExecutor(max_workers=min(WORKFLOW_START_CONCURRENCY, len(created))) as executor:
+            for result in executor.map(start, created):
+                results[result['index']] = result
+        
+        started = [(r['order_id'], r['execution_arn']) for r in results if r['status'] == 'created']
+        if started:
+            conn = get_db_connection()
+            try:
+                save_execution_arns(conn, started)
+            finally:
+                release_db_connection(conn)
+    
+    failed = [r for r in results if r['status'] == 'failed']
+    workflow_failed = [r for r in results if r['status'] == 'workflow_failed']
+    
+    if not created:
+        status_code = 400
+    elif failed or workflow_failed:
+        status_code = 207
+    else:
+        status_code = 201
+    
+    return response(status_code, {
+        'message': f"{len(created)} of {len(orders)} orders created",
+        'batch_id': batch_id,
+        'created': len(created),
+        'failed': len(failed),
+        'workflow_failed': len(workflow_failed),
+        'archive_keys': archive_keys,
+        'results': results
+    })
+
+def encode_cursor(created_at, order_id):
+    raw = json.dumps([created_at.isoformat(), order_id])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_cursor(cursor):
+    created_at, order_id = json.loads(base64.urlsafe_b64decode(cursor.encode()).decode())
+    return datetime.fromisoformat(created_at), order_id
+
+def count_orders(cur, mode):
+    """
+    Total order count for pagination.
+    mode: 'exact' (COUNT(*)), 'estimate' (pg_class.reltuples),
+    'auto' (estimate, exact only while the table is small) or 'none'.
+    Returns (total, is_estimate).
+    """
+    if mode == 'none':
+        return None, False
+    
+    if mode in ('estimate', 'auto'):
+        # orders dipartisi: estimasi = jumlah reltuples partisinya (partisi
+        # yang belum pernah di-ANALYZE, mis. bulan depan, dihitung 0)
+        cur.execute("""
+            SELECT CASE WHEN c.relkind = 'p' THEN (
+                       SELECT COALESCE(SUM(GREATEST(p.reltuples, 0)), 0)
+                       FROM pg_inherits i
+                       JOIN pg_class p ON p.oid = i.inhrelid
+                       WHERE i.inhparent = c.oid
+                   ) ELSE c.reltuples END::bigint
+            FROM pg_class c
+            WHERE c.oid = 'orders'::regclass
+        """)
+        row = cur.fetchone()
+        estimate = row[0] if row else -1
+        # reltuples = -1 berarti tabel belum pernah di-ANALYZE
+        if estimate >= 0 and (mode == 'estimate' or estimate >= ORDER_COUNT_EXACT_THRESHOLD):
+            return estimate, True
+    
+    cur.execute("SELECT COUNT(*) FROM orders")
+    return cur.fetchone()[0], False
 
 def list_orders(event):
+    """
+    GET /orders
+    Page mode (?page=&limit=) or keyset mode (?cursor=). Keyset mode pages
+    on (created_at, order_id) and returns an opaque next_cursor; pass
+    cursor= (empty) for the first page.
+    """
     params = event.get('queryStringParameters', {}) or {}
-    page = int(params.get('page', 1))
     limit = int(params.get('limit', 10))
-    offset = (page - 1) * limit
+    use_cursor = 'cursor' in params
+    count_mode = params.get('count', 'none' if use_cursor else 'auto')
     
-    conn = get_db_connection()
+    if count_mode not in ('exact', 'estimate', 'auto', 'none'):
+        return response(400, {'message': 'count must be one of exact, estimate, auto, none'})
+    
+    conn = get_db_connection(readonly=True)
     cur = conn.cursor()
     
     try:
-        cur.execute("""
-            SELECT order_id, customer_id, total_amount, status, created_at
-            FROM orders
-            ORDER BY created_at DESC
-            LIMIT %s OFFSET %s
-        """, (limit, offset))
+        if use_cursor:
+            if params.get('cursor'):
+                try:
+                    cursor_created_at, cursor_order_id = decode_cursor(params['cursor'])
+                except Exception:
+                    return response(400, {'message': 'Invalid cursor'})
+                
+                # created_at <= cursor terpisah supaya partisi yang lebih baru
+                # di-prune (row comparison tidak dipakai untuk pruning)
+                cur.execute("""
+                    SELECT order_id, customer_id, total_amount, status, created_at
+                    FROM orders
+                    WHERE created_at <= %s
+                    AND (created_at, order_id) < (%s, %s)
+                    ORDER BY created_at DESC, order_id DESC
+                    LIMIT %s
+                """, (cursor_created_at, cursor_created_at, cursor_order_id, limit + 1))
+            else:
+                cur.execute("""
+                    SELECT order_id, customer_id, total_amount, status, created_at
+                    FROM orders
+                    ORDER BY created_at DESC, order_id DESC
+                    LIMIT %s
+                """, (limit + 1,))
+        else:
+            page = int(params.get('page', 1))
+            offset = (page - 1) * limit
+            cur.execute("""
+                SELECT order_id, customer_id, total_amount, status, created_at
+                FROM orders
+                ORDER BY created_at DESC, order_id DESC
+                LIMIT %s OFFSET %s
+            """, (limit, offset))
+        
+        rows = cur.fetchall()
+        has_more = use_cursor and len(rows) > limit
+        rows = rows[:limit]
         
         orders = []
-        for row in cur.fetchall():
+        for row in rows:
             orders.append({
                 'order_id': row[0],
                 'customer_id': row[1],
@@ -375,42 +955,69 @@ def list_orders(event):
                 'created_at': row[4].isoformat()
             })
         
-        cur.execute("SELECT COUNT(*) FROM orders")
-        total = cur.fetchone()[0]
+        total, is_estimate = count_orders(cur, count_mode)
         
-        return response(200, {
-            'orders': orders,
-            'pagination': {
-                'page': page,
+        if use_cursor:
+            pagination = {
                 'limit': limit,
-                'total': total,
-                'pages': (total + limit - 1) // limit
+                'next_cursor': encode_cursor(rows[-1][4], rows[-1][0]) if has_more else None
             }
+        else:
+            pagination = {
+                'page': page,
+                'limit': limit
+            }
+            if total is not None:
+                pagination['pages'] = (total + limit - 1) // limit
+        
+        if total is not None:
+            pagination['total'] = total
+            pagination['total_is_estimate'] = is_estimate
+        
+        return response(200, {
+            'orders': orders,
+            'pagination': pagination
         })
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
 
-def get_order(order_id):
-    conn = get_db_connection()
+def find_order(cur, order_id):
+    """
+    Order row by id. order_id alone cannot prune the monthly partitions, so
+    the last ORDER_LOOKUP_RECENT_DAYS are tried first (one or two
+    partitions) and only a miss probes every partition.
+    """
+    execute_prepared(cur, 'order_by_id_recent', (order_id, ORDER_LOOKUP_RECENT_DAYS))
+    row = cur.fetchone()
+    if not row:
+        execute_prepared(cur, 'order_by_id', (order_id,))
+        row = cur.fetchone()
+    return row
+
+def get_order(order_id, consistent=False):
+    """
+    Reads go to the replica unless consistent=True (?consistency=strong).
+    An order the replica does not have yet (just created) is looked up
+    again on the primary before answering 404.
+    """
+    conn = get_db_connection(readonly=not consistent)
     cur = conn.cursor()
     
     try:
-        cur.execute("""
-            SELECT order_id, customer_id, total_amount, status, created_at
-            FROM orders
-            WHERE order_id = %s
-        """, (order_id,))
+        row = find_order(cur, order_id)
+        if not row and conn.role == 'replica':
+            cur.close()
+            release_db_connection(conn)
+            conn = get_db_connection()
+            cur = conn.cursor()
+            row = find_order(cur, order_id)
         
-        row = cur.fetchone()
         if not row:
             return response(404, {'message': 'Order not found'})
         
-        cur.execute("""
-            SELECT product_id, quantity, price
-            FROM order_items
-            WHERE order_id = %s
-        """, (order_id,))
+        # Item ada di partisi bulan yang sama (created_at = created_at order)
+        execute_prepared(cur, 'order_items_by_order', (order_id, row[4]))
         
         items = []
         for item_row in cur.fetchall():
@@ -430,7 +1037,7 @@ def get_order(order_id):
         })
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
 
 def update_order(order_id, event):
     body = json.loads(event['body'])
@@ -461,7 +1068,7 @@ def update_order(order_id, event):
         })
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
 
 def delete_order(order_id):
     conn = get_db_connection()
@@ -482,7 +1089,7 @@ def delete_order(order_id):
         })
     finally:
         cur.close()
-        conn.close()
+        release_db_connection(conn)
 
 def construct_execution_arn(order_id):
     """
@@ -502,8 +1109,8 @@ def construct_execution_arn(order_id):
             
             # Try different execution name patterns
             possible_names = [
+                f"order-{order_id}",         # order- prefix (create_order)
                 order_id,                    # just the order ID
-                f"order-{order_id}",         # order- prefix
                 f"exec-{order_id}",          # exec- prefix
                 f"{order_id[:8]}",           # first 8 chars
             ]
@@ -526,10 +1133,97 @@ def construct_execution_arn(order_id):
         print(f"Error constructing execution ARN: {e}")
         return None
 
+def _parse_date_param(value):
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed
+
+def _match_execution(execution, name_prefix, started_after, started_before):
+    """
+    Returns 'match', 'skip' or 'stop'. list_executions is sorted newest
+    first, so once startDate drops below started_after nothing else can match.
+    """
+    start_date = execution.get('startDate')
+    if started_after and start_date and start_date < started_after:
+        return 'stop'
+    if started_before and start_date and start_date >= started_before:
+        return 'skip'
+    if name_prefix and not execution.get('name', '').startswith(name_prefix):
+        return 'skip'
+    return 'match'
+
+def _execution_summary(execution):
+    return {
+        'execution_arn': execution.get('executionArn'),
+        'name': execution.get('name'),
+        'status': execution.get('status'),
+        'start_date': execution.get('startDate').isoformat() if execution.get('startDate') else None,
+        'stop_date': execution.get('stopDate').isoformat() if execution.get('stopDate') else None
+    }
+
+def aggregate_executions(status_filter, name_prefix, started_after, started_before, next_token=None):
+    """
+    Count executions per status, at most EXECUTIONS_MAX_PAGES pages of
+    1000 per call. Only counters are kept, executions are never held in
+    memory. When the bound is hit the counts are partial and next_token
+    continues the scan; the caller adds up the counts of every call.
+    """
+    list_kwargs = {
+        'stateMachineArn': STATE_MACHINE_ARN,
+        'maxResults': 1000
+    }
+    if status_filter != 'ALL':
+        list_kwargs['statusFilter'] = status_filter
+    
+    token = None
+    if next_token:
+        try:
+            token = json.loads(base64.urlsafe_b64decode(next_token.encode()).decode())['token']
+        except Exception:
+            return response(400, {'message': 'Invalid next_token'})
+    
+    counts = {}
+    scanned = 0
+    pages = 0
+    while True:
+        if token:
+            list_kwargs['nextToken'] = token
+        else:
+            list_kwargs.pop('nextToken', None)
+        
+        page = sfn_client.list_executions(**list_kwargs)
+        pages += 1
+        stopped = False
+        for execution in page.get('executions', []):
+            scanned += 1
+            match = _match_execution(execution, name_prefix, started_after, started_before)
+            if match == 'stop':
+                stopped = True
+                break
+            if match == 'match':
+                counts[execution['status']] = counts.get(execution['status'], 0) + 1
+        
+        token = None if stopped else page.get('nextToken')
+        # Batas yang sama dengan list biasa: rentang lebar jangan sampai timeout / throttling
+        if not token or pages >= EXECUTIONS_MAX_PAGES:
+            break
+    
+    return response(200, {
+        'counts': counts,
+        'total': sum(counts.values()),
+        'scanned': scanned,
+        'complete': token is None,
+        'next_token': base64.urlsafe_b64encode(json.dumps({'token': token}).encode()).decode() if token else None,
+        'state_machine': STATE_MACHINE_ARN
+    })
+
 def list_executions(event):
     """
     GET /executions
-    List all Step Functions executions
+    List Step Functions executions, newest first.
+    Query params: status, limit, next_token (opaque, from the previous
+    response), name_prefix, started_after, started_before, aggregate=status.
     """
     try:
         # Handle CORS preflight
@@ -538,27 +1232,90 @@ def list_executions(event):
         
         params = event.get('queryStringParameters', {}) or {}
         status_filter = params.get('status', 'ALL')
-        max_results = int(params.get('limit', 50))
+        limit = max(1, min(int(params.get('limit', 50)), 1000))
+        name_prefix = params.get('name_prefix')
         
-        exec_list_response = sfn_client.list_executions(
-            stateMachineArn=STATE_MACHINE_ARN,
-            statusFilter=status_filter,
-            maxResults=max_results
-        )
+        try:
+            started_after = _parse_date_param(params['started_after']) if params.get('started_after') else None
+            started_before = _parse_date_param(params['started_before']) if params.get('started_before') else None
+        except ValueError:
+            return response(400, {'message': 'started_after/started_before must be ISO-8601 dates'})
         
+        if params.get('aggregate') == 'status':
+            return aggregate_executions(status_filter, name_prefix, started_after, started_before, params.get('next_token'))
+        
+        # Token berisi posisi di halaman Step Functions (token + offset)
+        position = {'token': None, 'offset': 0, 'size': limit}
+        if params.get('next_token'):
+            try:
+                position = json.loads(base64.urlsafe_b64decode(params['next_token'].encode()).decode())
+            except Exception:
+                return response(400, {'message': 'Invalid next_token'})
+        
+        list_kwargs = {
+            'stateMachineArn': STATE_MACHINE_ARN,
+            'maxResults': position['size']
+        }
+        if status_filter != 'ALL':
+            list_kwargs['statusFilter'] = status_filter
+        
+        token = position['token']
+        offset = position['offset']
         executions = []
-        for exec in exec_list_response.get('executions', []):
-            executions.append({
-                'execution_arn': exec.get('executionArn'),
-                'name': exec.get('name'),
-                'status': exec.get('status'),
-                'start_date': exec.get('startDate').isoformat() if exec.get('startDate') else None,
-                'stop_date': exec.get('stopDate').isoformat() if exec.get('stopDate') else None
-            })
+        next_position = None
+        scanned = 0
+        pages = 0
+        
+        while True:
+            if token:
+                list_kwargs['nextToken'] = token
+            else:
+                list_kwargs.pop('nextToken', None)
+            
+            page = sfn_client.list_executions(**list_kwargs)
+            pages += 1
+            page_executions = page.get('executions', [])
+            page_token = page.get('nextToken')
+            done = False
+            
+            for i in range(offset, len(page_executions)):
+                scanned += 1
+                match = _match_execution(page_executions[i], name_prefix, started_after, started_before)
+                if match == 'stop':
+                    done = True
+                    break
+                if match == 'skip':
+                    continue
+                
+                executions.append(_execution_summary(page_executions[i]))
+                if len(executions) == limit:
+                    if i + 1 < len(page_executions):
+                        next_position = {'token': token, 'offset': i + 1, 'size': position['size']}
+                    elif page_token:
+                        next_position = {'token': page_token, 'offset': 0, 'size': position['size']}
+                    done = True
+                    break
+            
+            if done or not page_token:
+                break
+            
+            token = page_token
+            offset = 0
+            
+            # Filter yang jarang match jangan sampai scan tanpa batas
+            if pages >= EXECUTIONS_MAX_PAGES:
+                next_position = {'token': token, 'offset': 0, 'size': position['size']}
+                break
+        
+        next_token = None
+        if next_position:
+            next_token = base64.urlsafe_b64encode(json.dumps(next_position).encode()).decode()
         
         return response(200, {
             'executions': executions,
             'count': len(executions),
+            'next_token': next_token,
+            'scanned': scanned,
             'state_machine': STATE_MACHINE_ARN
         })
         
@@ -569,11 +1326,111 @@ def list_executions(event):
             'error': str(e)
         })
 
+def build_workflow_status(execution_arn, execution):
+    """
+    Build the status payload from a describe_execution response.
+    """
+    result_data = {
+        'execution_arn': execution_arn,
+        'status': execution['status'],
+        'start_date': execution['startDate'].isoformat()
+    }
+    
+    # Add stop date if available
+    if 'stopDate' in execution and execution['stopDate']:
+        result_data['stop_date'] = execution['stopDate'].isoformat()
+    
+    # Add execution name if available
+    if 'name' in execution:
+        result_data['execution_name'] = execution['name']
+    
+    # Parse input/output
+    if 'input' in execution and execution['input']:
+        try:
+            result_data['input'] = json.loads(execution['input'])
+        except:
+            result_data['input_raw'] = execution['input']
+    
+    if 'output' in execution and execution['output']:
+        try:
+            result_data['output'] = json.loads(execution['output'])
+        except:
+            result_data['output_raw'] = execution['output']
+    
+    return result_data
+
+def _remember_workflow_status(execution_arn, result_data):
+    # Terminal status tidak pernah berubah, simpan tanpa expiry
+    if result_data['status'] in TERMINAL_EXECUTION_STATUSES:
+        expires_at = None
+    else:
+        expires_at = time.time() + WORKFLOW_STATUS_TTL
+    
+    if len(_workflow_status_cache) >= WORKFLOW_STATUS_CACHE_MAX:
+        _workflow_status_cache.pop(next(iter(_workflow_status_cache)))
+    _workflow_status_cache[execution_arn] = (result_data, expires_at)
+
+def get_cached_workflow_status(execution_arn):
+    """
+    Look up a workflow status in the warm-container cache, then in the
+    workflow_status_cache table. Terminal results never expire; running
+    ones are valid for WORKFLOW_STATUS_TTL seconds.
+    Returns (result_data, source) or (None, None) on a miss.
+    """
+    entry = _workflow_status_cache.get(execution_arn)
+    if entry and (entry[1] is None or entry[1] > time.time()):
+        return entry[0], 'memory'
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        execute_prepared(cur, 'workflow_status_cached', (execution_arn,))
+        row = cur.fetchone()
+        if not row:
+            return None, None
+        
+        result_data, is_terminal, age_seconds = row
+        if not is_terminal and age_seconds >= WORKFLOW_STATUS_TTL:
+            return None, None
+        
+        _remember_workflow_status(execution_arn, result_data)
+        return result_data, 'database'
+    except Exception as e:
+        print(f"Error reading workflow status cache: {str(e)}")
+        return None, None
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+def store_workflow_status(execution_arn, result_data):
+    """
+    Save a freshly described status in both cache levels. A terminal row
+    in the table is never overwritten.
+    """
+    _remember_workflow_status(execution_arn, result_data)
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        execute_prepared(cur, 'workflow_status_store', (
+            execution_arn,
+            result_data['status'],
+            json.dumps(result_data),
+            result_data['status'] in TERMINAL_EXECUTION_STATUSES
+        ))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error writing workflow status cache: {str(e)}")
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
 def get_workflow_status(identifier):
     """
     Get workflow status by either:
     1. Execution ARN (from create_order response)
-    2. Order ID (will search for executions)
+    2. Order ID (indexed lookup in order_executions)
     """
     print(f"get_workflow_status called with identifier: {identifier}")
     
@@ -583,54 +1440,22 @@ def get_workflow_status(identifier):
             execution_arn = identifier
             print(f"Using provided execution ARN: {execution_arn}")
         else:
-            # It's an order ID, we need to find the execution
+            # It's an order ID, look up the recorded execution
             order_id = identifier
-            print(f"Searching for execution for order: {order_id}")
+            print(f"Looking up execution for order: {order_id}")
             
-            # Method 1: List executions and find by name
-            state_machine_arn = STATE_MACHINE_ARN
-            print(f"State Machine ARN: {state_machine_arn}")
+            execution_arn = find_execution_arn(order_id)
             
-            # Extract state machine name
-            state_machine_name = state_machine_arn.split(':')[-1]
-            
-            # List executions for this state machine
-            try:
-                executions_response = sfn_client.list_executions(
-                    stateMachineArn=state_machine_arn,
-                    statusFilter='ALL',  # Include all statuses
-                    maxResults=100
-                )
-                
-                print(f"Found {len(executions_response.get('executions', []))} executions total")
-                
-                # Look for execution with matching name pattern
-                execution_arn = None
-                for execution in executions_response.get('executions', []):
-                    exec_name = execution.get('name', '')
-                    exec_arn = execution.get('executionArn', '')
-                    
-                    # Check if execution name contains order ID
-                    if order_id in exec_name:
-                        execution_arn = exec_arn
-                        print(f"Found matching execution: {execution_arn}")
-                        break
-                    
-                    # Also check if name is exactly the order ID
-                    if exec_name == order_id or exec_name == f"order-{order_id}":
-                        execution_arn = exec_arn
-                        print(f"Found exact matching execution: {execution_arn}")
-                        break
-                
-                if not execution_arn:
-                    # Method 2: Try to construct execution ARN
-                    print("Trying to construct execution ARN...")
-                    execution_arn = construct_execution_arn(order_id)
-                    
-            except Exception as list_error:
-                print(f"Error listing executions: {list_error}")
-                # Fall back to constructing ARN
+            if not execution_arn:
+                # Order lama yang belum di-backfill, coba nama execution standar
+                print("No recorded execution, trying to construct execution ARN...")
                 execution_arn = construct_execution_arn(order_id)
+                if execution_arn:
+                    conn = get_db_connection()
+                    try:
+                        save_execution_arns(conn, [(order_id, execution_arn)])
+                    finally:
+                        release_db_connection(conn)
         
         if not execution_arn:
             return response(404, {
@@ -639,39 +1464,25 @@ def get_workflow_status(identifier):
                 'hint': 'The workflow may not have been started yet or the order ID is incorrect'
             })
         
-        # Get execution details
-        execution = sfn_client.describe_execution(executionArn=execution_arn)
-        
-        # Build response data
-        result_data = {
-            'execution_arn': execution_arn,
-            'status': execution['status'],
-            'start_date': execution['startDate'].isoformat(),
-            'input_identifier': identifier
-        }
-        
-        # Add stop date if available
-        if 'stopDate' in execution and execution['stopDate']:
-            result_data['stop_date'] = execution['stopDate'].isoformat()
-        
-        # Add execution name if available
-        if 'name' in execution:
-            result_data['execution_name'] = execution['name']
+        # Cache dulu, describe_execution hanya kalau cache miss / expired
+        cached_data, cache_source = get_cached_workflow_status(execution_arn)
         
-        # Parse input/output
-        if 'input' in execution and execution['input']:
-            try:
-                result_data['input'] = json.loads(execution['input'])
-            except:
-                result_data['input_raw'] = execution['input']
-        
-        if 'output' in execution and execution['output']:
-            try:
-                result_data['output'] = json.loads(execution['output'])
-            except:
-                result_data['output_raw'] = execution['output']
-        
-        return response(200, result_data)
+        if cached_data is not None:
+            result_data = dict(cached_data)
+        else:
+            execution = sfn_client.describe_execution(executionArn=execution_arn)
+            result_data = build_workflow_status(execution_arn, execution)
+            store_workflow_status(execution_arn, result_data)
+            cache_source = 'miss'
+        
+        is_terminal = result_data['status'] in TERMINAL_EXECUTION_STATUSES
+        result_data['input_identifier'] = identifier
+        result_data['cache'] = cache_source
+        
+        return response(200, result_data, headers={
+            'Cache-Control': 'private, max-age=31536000, immutable' if is_terminal
+            else f'private, max-age={WORKFLOW_STATUS_TTL}'
+        })
         
     except sfn_client.exceptions.ExecutionDoesNotExist:
         return response(404, {
@@ -693,6 +1504,10 @@ def get_workflow_status(identifier):
 def lambda_handler(event, context):
     print(f"Event received: {json.dumps(event, indent=2)}")
     
+    # Direct invocation (bukan dari API Gateway)
+    if event.get('action') == 'backfill_order_executions':
+        return backfill_order_executions(event)
+    
     http_method = event.get('httpMethod', '')
     resource = event.get('resource', '')  # Gunakan resource, bukan path!
     
@@ -720,13 +1535,18 @@ def lambda_handler(event, context):
         elif resource == '/orders' and http_method == 'POST':
             print("Routing to create_order")
             return create_order(event)
+        
+        elif resource == '/orders/batch' and http_method == 'POST':
+            print("Routing to create_orders_batch")
+            return create_orders_batch(event)
             
         elif resource == '/orders/{id}' and http_method == 'GET':
             print("Routing to get_order")
             if not event.get('pathParameters') or 'id' not in event['pathParameters']:
                 return response(400, {'message': 'Order ID is required'})
             order_id = event['pathParameters']['id']
-            return get_order(order_id)
+            params = event.get('queryStringParameters') or {}
+            return get_order(order_id, consistent=params.get('consistency') == 'strong')
             
         elif resource == '/orders/{id}' and http_method == 'PUT':
             print("Routing to update_order")
@@ -755,7 +1575,7 @@ def lambda_handler(event, context):
         
         else:
             print(f"NO ROUTE MATCHED - Method: {http_method}, Resource: {resource}")
-            print(f"Available resources: /customers, /products, /orders, /orders/{{id}}, /status/{{id}}, /executions")
+            print(f"Available resources: /customers, /products, /orders, /orders/batch, /orders/{{id}}, /status/{{id}}, /executions")
             return response(400, {
                 'message': 'Invalid request',
                 'debug_info': {
@@ -766,6 +1586,7 @@ def lambda_handler(event, context):
                         'GET /products',
                         'GET /orders',
                         'POST /orders',
+                        'POST /orders/batch',
                         'GET /orders/{id}',
                         'PUT /orders/{id}',
                         'DELETE /orders/{id}',
@@ -783,4 +1604,7 @@ def lambda_handler(event, context):
             'message': 'Internal server error',
             'error': str(e),
             'traceback': traceback.format_exc()
-        })
\ No newline at end of file
+        })
+    finally:
+        if DB_POOL_STATS_LOG:
+            print(f"DB pool stats: {json.dumps(get_pool_stats())}")
\ No newline at end of file
@@ -0,0 +1,163 @@
+"""
+Hot SKU benchmark for update_inventory.
+
+Runs concurrent single-unit orders against ONE product and reports
+throughput for the normal row-lock path and for the sharded hot SKU path.
+Needs a database created by init_database; the benchmark product is
+created and removed by the script.
+
+Usage:
+    DB_HOST=... DB_NAME=... DB_USER=... DB_PASSWORD=... \
+    python benchmark_hot_sku.py --workers 32 --orders 4000 --shards 16
+
+--hold-ms keeps each transaction open a little longer after the stock
+decrement, like the rest of the real transaction (order status update,
+commit round-trip) does. That is the window in which the row lock on a
+single inventory row serializes every order.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from datetime import datetime
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'layer', 'python'))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault('AWS_DEFAULT_REGION', 'us-east-1')
+
+from db_layer import get_db_connection, release_db_connection, execute_prepared
+import lambda_function as update_inventory
+
+PRODUCT_ID = 'BENCH-HOT-SKU'
+
+
+def setup_product(stock):
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("""
+        INSERT INTO inventory (product_id, product_name, price, stock_quantity)
+        VALUES (%s, 'Benchmark Hot SKU', 1.00, %s)
+        ON CONFLICT (product_id) DO UPDATE SET stock_quantity = EXCLUDED.stock_quantity
+    """, (PRODUCT_ID, stock))
+    cur.execute("DELETE FROM inventory_stock_shards WHERE product_id = %s", (PRODUCT_ID,))
+    conn.commit()
+    cur.close()
+    release_db_connection(conn)
+
+
+def remove_product():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("DELETE FROM inventory WHERE product_id = %s", (PRODUCT_ID,))
+    conn.commit()
+    cur.close()
+    release_db_connection(conn)
+
+
+def read_stock():
+    conn = get_db_connection()
+    cur = conn.cursor()
+    cur.execute("SELECT stock_quantity FROM inventory WHERE product_id = %s", (PRODUCT_ID,))
+    stock = cur.fetchone()[0]
+    cur.close()
+    release_db_connection(conn)
+    return stock
+
+
+def order_row_mode(cur):
+    execute_prepared(cur, 'inventory_decrement_cart', ([PRODUCT_ID], [1], datetime.now()))
+    return cur.fetchall()[0][4] is not None
+
+
+def order_shard_mode(cur):
+    taken, _ = update_inventory.take_from_shards(cur, PRODUCT_ID, 1)
+    return taken
+
+
+def run(mode, workers, orders, hold_ms):
+    place_order = order_row_mode if mode == 'row' else order_shard_mode
+    per_worker = orders // workers
+    latencies = []
+    failures = [0]
+    lock = threading.Lock()
+    barrier = threading.Barrier(workers + 1)
+
+    def worker():
+        conn = get_db_connection()
+        cur = conn.cursor()
+        local = []
+        barrier.wait()
+        for _ in range(per_worker):
+            started = time.perf_counter()
+            ok = place_order(cur)
+            if hold_ms:
+                time.sleep(hold_ms / 1000.0)
+            conn.commit()
+            local.append(time.perf_counter() - started)
+            if not ok:
+                with lock:
+                    failures[0] += 1
+        cur.close()
+        conn.close()
+        with lock:
+            latencies.extend(local)
+
+    threads = [threading.Thread(target=worker) for _ in range(workers)]
+    for thread in threads:
+        thread.start()
+    barrier.wait()
+    started = time.perf_counter()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return {
+        'mode': mode,
+        'orders': len(latencies),
+        'failed': failures[0],
+        'seconds': round(elapsed, 2),
+        'orders_per_sec': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(latencies[len(latencies) // 2] * 1000, 2),
+        'p99_ms': round(latencies[int(len(latencies) * 0.99) - 1] * 1000, 2)
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Single hot SKU throughput: row lock vs sharded stock')
+    parser.add_argument('--workers', type=int, default=32)
+    parser.add_argument('--orders', type=int, default=4000)
+    parser.add_argument('--shards', type=int, default=16)
+    parser.add_argument('--hold-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    initial_stock = args.orders * 2
+    results = []
+
+    try:
+        # Before: semua order antri di satu baris inventory
+        setup_product(initial_stock)
+        result = run('row', args.workers, args.orders, args.hold_ms)
+        result['stock_ok'] = read_stock() == initial_stock - result['orders'] + result['failed']
+        results.append(result)
+
+        # After: stok dipecah ke shard
+        setup_product(initial_stock)
+        update_inventory.enable_hot_sku({'product_id': PRODUCT_ID, 'shards': args.shards})
+        result = run('shard', args.workers, args.orders, args.hold_ms)
+        update_inventory.compact_stock_shards({})
+        result['stock_ok'] = read_stock() == initial_stock - result['orders'] + result['failed']
+        results.append(result)
+    finally:
+        remove_product()
+
+    print(f"{'mode':<6} {'orders':>7} {'failed':>7} {'seconds':>8} {'orders/s':>9} {'p50 ms':>8} {'p99 ms':>8}  stock")
+    for r in results:
+        print(f"{r['mode']:<6} {r['orders']:>7} {r['failed']:>7} {r['seconds']:>8} {r['orders_per_sec']:>9} "
+              f"{r['p50_ms']:>8} {r['p99_ms']:>8}  {'OK' if r['stock_ok'] else 'MISMATCH'}")
+    print(f"speedup: {results[1]['orders_per_sec'] / results[0]['orders_per_sec']:.1f}x")
+
+
+if __name__ == '__main__':
+    main()
@@ -1,29 +1,349 @@
 import json
 import os
-import psycopg2
+import time
+import random
 import boto3
+from psycopg2 import errors
+from psycopg2.extras import execute_values
 from datetime import datetime
 
-# Environment variables
-DB_HOST = os.environ.get('DB_HOST')
-DB_NAME = os.environ.get('DB_NAME')
-DB_USER = os.environ.get('DB_USER')
-DB_PASSWORD = os.environ.get('DB_PASSWORD')
+from db_layer import (
+    get_db_connection, release_db_connection, execute_prepared, bump_cache_version, get_stock_thresholds
+)
+
+# Retry kalau transaksi kena deadlock / serialization failure
+INVENTORY_DEADLOCK_RETRIES = int(os.environ.get('INVENTORY_DEADLOCK_RETRIES', 3))
+INVENTORY_RETRY_BACKOFF = float(os.environ.get('INVENTORY_RETRY_BACKOFF', 0.05))
+
+# Hot SKU mode (opt-in): flag ini hanya mengizinkan enable_hot_sku. Jalur order
+# selalu mengikuti baris inventory_stock_shards, lihat compact_stock_shards()
+INVENTORY_HOT_SKU_MODE = os.environ.get('INVENTORY_HOT_SKU_MODE', 'false').lower() == 'true'
+HOT_SKU_DEFAULT_SHARDS = int(os.environ.get('HOT_SKU_DEFAULT_SHARDS', 8))
+
+# Low stock event: dedup window dan retry put_events
+LOW_STOCK_DEDUP_SECONDS = int(os.environ.get('LOW_STOCK_DEDUP_SECONDS', 3600))
+EVENTBRIDGE_MAX_ATTEMPTS = int(os.environ.get('EVENTBRIDGE_MAX_ATTEMPTS', 3))
+EVENTBRIDGE_RETRY_BACKOFF = float(os.environ.get('EVENTBRIDGE_RETRY_BACKOFF', 0.1))
 
 eventbridge = boto3.client('events')
 
-def get_db_connection():
-    return psycopg2.connect(
-        host=DB_HOST,
-        database=DB_NAME,
-        user=DB_USER,
-        password=DB_PASSWORD
-    )
+# product_id -> waktu alert terakhir dari container ini
+_recent_low_stock_alerts = {}
+
+# =====================================================
+# HOT SKU MODE (SHARDED STOCK COUNTERS)
+# =====================================================
+# For products with rows in inventory_stock_shards, orders decrement one of
+# N shard counters instead of the single inventory row, so concurrent
+# orders for the same product stop queueing on one row lock. Shards hold
+# allocatable stock and can never go negative, so overselling is still
+# impossible. compact_stock_shards() folds the sold counters back into
+# inventory.stock_quantity and rebalances the shards.
+
+def get_hot_products(cur, product_ids):
+    """
+    Returns {product_id: (product_name, category)} for the products that have shards.
+    """
+    if not product_ids:
+        return {}
+    execute_prepared(cur, 'stock_shards_hot_products', (product_ids,))
+    return {row[0]: (row[1], row[2]) for row in cur.fetchall()}
+
+def take_from_shards(cur, product_id, quantity):
+    """
+    Allocate quantity from a product's shards.
+    Fast path: one random unlocked shard with enough stock (SKIP LOCKED).
+    Slow path: lock all shards in shard order and take greedily.
+    Returns (taken, available_after).
+    """
+    execute_prepared(cur, 'stock_shard_take', (product_id, quantity))
+    if cur.fetchone():
+        execute_prepared(cur, 'stock_shards_available', (product_id,))
+        return True, cur.fetchone()[0]
+    
+    execute_prepared(cur, 'stock_shards_lock', (product_id,))
+    shards = cur.fetchall()
+    available = sum(shard_quantity for _, shard_quantity in shards)
+    if available < quantity:
+        return False, available
+    
+    shard_nos = []
+    takes = []
+    remaining = quantity
+    for shard_no, shard_quantity in shards:
+        if remaining == 0:
+            break
+        take = min(shard_quantity, remaining)
+        if take > 0:
+            shard_nos.append(shard_no)
+            takes.append(take)
+            remaining -= take
+    
+    execute_prepared(cur, 'stock_shards_take_many', (product_id, shard_nos, takes))
+    return True, available - quantity
+
+def enable_hot_sku(event):
+    """
+    {"action": "enable_hot_sku", "product_id": "PROD001", "shards": 8}
+    Split the product's current stock across shard counters. A product
+    that is already hot is compacted first, so units sold through the old
+    shards are not counted again.
+    """
+    product_id = event.get('product_id')
+    shard_count = int(event.get('shards', HOT_SKU_DEFAULT_SHARDS))
+    if not INVENTORY_HOT_SKU_MODE:
+        return {'status': 'failed', 'message': 'Hot SKU mode is disabled (INVENTORY_HOT_SKU_MODE)'}
+    if not product_id or shard_count < 1:
+        return {'status': 'failed', 'message': 'product_id and shards >= 1 are required'}
+    
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        # Lock inventory + shard lama, kurangi stok dengan `sold`, lalu hapus shard
+        stock_quantity = compact_product_shards(cur, product_id, remove=True)
+        if stock_quantity is None:
+            return {'status': 'failed', 'message': f'Product {product_id} not found'}
+        
+        execute_values(cur, """
+            INSERT INTO inventory_stock_shards (product_id, shard_no, quantity, sold)
+            VALUES %s
+        """, [(product_id, shard_no, quantity, 0) for shard_no, quantity in enumerate(split_stock(stock_quantity, shard_count))])
+        conn.commit()
+        bump_cache_version(conn, 'catalog')
+        
+        print(f"Hot SKU mode enabled for {product_id} with {shard_count} shards")
+        return {'status': 'success', 'product_id': product_id, 'shards': shard_count, 'stock_quantity': stock_quantity}
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+def disable_hot_sku(event):
+    """
+    {"action": "disable_hot_sku", "product_id": "PROD001"}
+    Fold the shards into inventory.stock_quantity and remove them.
+    """
+    product_id = event.get('product_id')
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        stock_quantity = compact_product_shards(cur, product_id, remove=True)
+        conn.commit()
+        bump_cache_version(conn, 'catalog')
+        return {'status': 'success', 'product_id': product_id, 'stock_quantity': stock_quantity}
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+def split_stock(total, shard_count):
+    base, extra = divmod(total, shard_count)
+    return [base + (1 if shard_no < extra else 0) for shard_no in range(shard_count)]
+
+def compact_product_shards(cur, product_id, remove=False):
+    """
+    stock_quantity -= units sold through shards since the last compaction,
+    then spread the result evenly over the shards again. Restocks written
+    straight to inventory.stock_quantity are preserved.
+    """
+    cur.execute("SELECT stock_quantity FROM inventory WHERE product_id = %s FOR UPDATE", (product_id,))
+    row = cur.fetchone()
+    if not row:
+        return None
+    
+    execute_prepared(cur, 'stock_shards_lock_for_compaction', (product_id,))
+    shards = cur.fetchall()
+    sold = sum(shard[1] for shard in shards)
+    new_stock = max(row[0] - sold, 0)
+    
+    cur.execute("""
+        UPDATE inventory SET stock_quantity = %s, updated_at = %s WHERE product_id = %s
+    """, (new_stock, datetime.now(), product_id))
+    
+    if remove:
+        cur.execute("DELETE FROM inventory_stock_shards WHERE product_id = %s", (product_id,))
+    elif shards:
+        shard_nos = [shard[0] for shard in shards]
+        execute_prepared(cur, 'stock_shards_rebalance', (product_id, shard_nos, split_stock(new_stock, len(shard_nos))))
+    
+    return new_stock
+
+def compact_stock_shards(event):
+    """
+    {"action": "compact_stock_shards"} - run on a schedule (e.g. every minute).
+    Each product is compacted in its own short transaction.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    compacted = {}
+    try:
+        cur.execute("SELECT DISTINCT product_id FROM inventory_stock_shards ORDER BY product_id")
+        product_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+        
+        for product_id in product_ids:
+            compacted[product_id] = compact_product_shards(cur, product_id)
+            conn.commit()
+        
+        if compacted:
+            bump_cache_version(conn, 'catalog')
+        
+        print(f"Compacted stock shards: {compacted}")
+        return {'status': 'success', 'compacted': compacted}
+    except Exception as e:
+        conn.rollback()
+        print(f"Error compacting stock shards: {str(e)}")
+        return {'status': 'failed', 'message': str(e), 'compacted': compacted}
+    finally:
+        cur.close()
+        release_db_connection(conn)
+
+# =====================================================
+# LOW STOCK EVENTS
+# =====================================================
+
+def claim_low_stock_alerts(conn, product_ids):
+    """
+    Dedup low-stock alerts. A product may alert once per
+    LOW_STOCK_DEDUP_SECONDS: first in this warm container, then across
+    containers through low_stock_alert_log. Returns the IDs allowed to emit.
+    """
+    now = time.time()
+    candidates = [
+        product_id for product_id in product_ids
+        if _recent_low_stock_alerts.get(product_id, 0) <= now - LOW_STOCK_DEDUP_SECONDS
+    ]
+    if not candidates:
+        return set()
+    
+    cur = conn.cursor()
+    try:
+        execute_prepared(cur, 'low_stock_alert_claim', (candidates, LOW_STOCK_DEDUP_SECONDS))
+        claimed = {row[0] for row in cur.fetchall()}
+        conn.commit()
+    except Exception as e:
+        # Lebih baik alert dobel daripada alert hilang
+        conn.rollback()
+        print(f"Low stock dedup unavailable, sending all: {str(e)}")
+        claimed = set(candidates)
+    finally:
+        cur.close()
+    
+    for product_id in claimed:
+        _recent_low_stock_alerts[product_id] = now
+    return claimed
+
+def release_low_stock_alerts(conn, product_ids):
+    """
+    Forget claims whose events could not be delivered, so the next
+    crossing alerts again instead of being swallowed by the dedup window.
+    """
+    for product_id in product_ids:
+        _recent_low_stock_alerts.pop(product_id, None)
+    cur = conn.cursor()
+    try:
+        cur.execute("DELETE FROM low_stock_alert_log WHERE product_id = ANY(%s)", (list(product_ids),))
+        conn.commit()
+    except Exception as e:
+        conn.rollback()
+        print(f"Error releasing low stock claims: {str(e)}")
+    finally:
+        cur.close()
+
+def put_events_with_retry(entries):
+    """
+    Send entries in put_events calls of up to 10, retrying only the entries
+    that failed. Returns the entries that still failed after the retries.
+    """
+    failed = []
+    for start in range(0, len(entries), 10):
+        pending = entries[start:start + 10]
+        for attempt in range(EVENTBRIDGE_MAX_ATTEMPTS):
+            if attempt:
+                time.sleep(EVENTBRIDGE_RETRY_BACKOFF * (2 ** (attempt - 1)))
+            try:
+                result = eventbridge.put_events(Entries=pending)
+            except Exception as e:
+                print(f"put_events call failed (attempt {attempt + 1}): {str(e)}")
+                continue
+            
+            if not result.get('FailedEntryCount'):
+                pending = []
+                break
+            
+            # Entries di response urutannya sama dengan request
+            retry = []
+            for entry, outcome in zip(pending, result.get('Entries', [])):
+                if outcome.get('ErrorCode'):
+                    print(f"put_events entry failed: {outcome.get('ErrorCode')} {outcome.get('ErrorMessage')}")
+                    retry.append(entry)
+            pending = retry
+        failed.extend(pending)
+    return failed
+
+def emit_low_stock_events(conn, alerts):
+    claimed = claim_low_stock_alerts(conn, [alert['product_id'] for alert in alerts])
+    
+    entries = []
+    entry_products = []
+    for alert in alerts:
+        if alert['product_id'] not in claimed:
+            continue
+        entries.append({
+            'Source': 'order.system',
+            'DetailType': 'LowStock',
+            'Detail': json.dumps({
+                'product_id': alert['product_id'],
+                'product_name': alert['product_name'],
+                'current_stock': alert['current_stock'],
+                'timestamp': datetime.now().isoformat()
+            })
+        })
+        entry_products.append(alert['product_id'])
+    
+    failed = put_events_with_retry(entries) if entries else []
+    if failed:
+        failed_ids = {entry_products[entries.index(entry)] for entry in failed}
+        release_low_stock_alerts(conn, failed_ids)
+    
+    return {
+        'sent': len(entries) - len(failed),
+        'deduplicated': len(alerts) - len(entries),
+        'failed': len(failed)
+    }
+
+def find_applied_result(order_id):
+    """
+    Result recorded when this order's inventory update committed, or None.
+    """
+    conn = get_db_connection()
+    cur = conn.cursor()
+    try:
+        execute_prepared(cur, 'inventory_applied_result', (order_id,))
+        row = cur.fetchone()
+        if not row or row[0] is None:
+            return None
+        result = dict(row[0])
+        result['replayed'] = True
+        return result
+    finally:
+        cur.close()
+        release_db_connection(conn)
 
 def lambda_handler(event, context):
     print(f"=== INVENTORY UPDATE START ===")
     print(f"Event received: {json.dumps(event, indent=2)}")
     
+    # Direct invocation untuk administrasi hot SKU
+    action = event.get('action')
+    if action == 'enable_hot_sku':
+        return enable_hot_sku(event)
+    if action == 'disable_hot_sku':
+        return disable_hot_sku(event)
+    if action == 'compact_stock_shards':
+        return compact_stock_shards(event)
+    
     # Extract data - handle nested structure
     order_id = event.get('order_id')
     transaction_id = None
@@ -49,6 +369,12 @@ def lambda_handler(event, context):
 
     order_id = str(order_id)
     
+    # Retry dari Step Functions: order yang sudah diterapkan cukup dibaca ulang
+    replay = find_applied_result(order_id)
+    if replay is not None:
+        print(f"Order {order_id} already applied, returning recorded result")
+        return replay
+    
     # If items are empty, fetch from database
     if not items:
         try:
@@ -56,12 +382,7 @@ def lambda_handler(event, context):
             conn = get_db_connection()
             cur = conn.cursor()
             
-            cur.execute("""
-                SELECT oi.product_id, oi.quantity, i.product_name, i.price
-                FROM order_items oi
-                JOIN inventory i ON oi.product_id = i.product_id
-                WHERE oi.order_id = %s
-            """, (order_id,))
+            execute_prepared(cur, 'order_items_with_product', (order_id,))
             
             items = []
             for row in cur.fetchall():
@@ -73,7 +394,7 @@ def lambda_handler(event, context):
                 })
             
             cur.close()
-            conn.close()
+            release_db_connection(conn)
             
             print(f"Fetched {len(items)} items from database")
             
@@ -89,107 +410,133 @@ def lambda_handler(event, context):
                 'message': f'Error fetching items: {str(e)}'
             }
     
+    # Gabungkan item per product, urutkan supaya lock selalu diambil
+    # dalam urutan product_id yang sama (tidak ada deadlock antar order)
+    quantities = {}
+    for item in items:
+        product_id = item.get('productId')
+        if not product_id:
+            print(f"Product ID not found for item: {item}")
+            continue
+        quantities[product_id] = quantities.get(product_id, 0) + item.get('quantity', 0)
+    
+    product_ids = sorted(quantities)
+    
     conn = get_db_connection()
     cur = conn.cursor()
     
     try:
-        updated_products = []
-        low_stock_alerts = []
+        deadlock_retries = 0
+        thresholds = get_stock_thresholds(cur)
         
-        for item in items:
-            product_id = item.get('productId')
-            quantity = item.get('quantity', 0)
-            
-            if not product_id:
-                print(f"Product ID not found for item: {item}")
-                continue
-            
-            # Check current stock
-            cur.execute("""
-                SELECT stock_quantity, product_name
-                FROM inventory
-                WHERE product_id = %s
-                FOR UPDATE
-            """, (product_id,))
-            
-            result = cur.fetchone()
-            if not result:
-                print(f"Product {product_id} not found in inventory")
-                continue
-            
-            current_stock, product_name = result
-            
-            # Check if sufficient stock
-            if current_stock < quantity:
-                conn.rollback()
-                error_msg = f'Insufficient stock for product {product_name}. Available: {current_stock}, Requested: {quantity}'
-                print(error_msg)
-                return {
-                    'inventoryStatus': 'failed',
-                    'message': error_msg
+        while True:
+            try:
+                # Klaim order_id di transaksi yang sama dengan pengurangan stok.
+                # Kalau sudah ada (retry yang balapan), pakai hasil yang tercatat.
+                execute_prepared(cur, 'inventory_apply_claim', (order_id,))
+                if not cur.fetchone():
+                    conn.rollback()
+                    print(f"Order {order_id} applied concurrently, returning recorded result")
+                    return find_applied_result(order_id)
+                
+                # Hot SKU (punya shard) dipisah dari product biasa. Selalu dibaca,
+                # tanpa melihat flag: stok product hot ada di shard
+                hot_products = get_hot_products(cur, product_ids)
+                normal_ids = [product_id for product_id in product_ids if product_id not in hot_products]
+                
+                rows = []
+                if normal_ids:
+                    execute_prepared(cur, 'inventory_decrement_cart', (
+                        normal_ids,
+                        [quantities[product_id] for product_id in normal_ids],
+                        datetime.now()
+                    ))
+                    rows = cur.fetchall()
+                
+                # new_stock NULL = UPDATE ditolak karena stok kurang
+                insufficient = [row for row in rows if row[4] is None]
+                
+                # Shard diproses setelah baris inventory, juga urut product_id
+                if not insufficient:
+                    for product_id in sorted(hot_products):
+                        product_name, category = hot_products[product_id]
+                        quantity = quantities[product_id]
+                        taken, available = take_from_shards(cur, product_id, quantity)
+                        if not taken:
+                            insufficient.append((product_id, product_name, available, quantity, None, category))
+                            break
+                        rows.append((product_id, product_name, available + quantity, quantity, available, category))
+                
+                if insufficient:
+                    conn.rollback()
+                    product_id, product_name, current_stock, quantity = insufficient[0][:4]
+                    error_msg = f'Insufficient stock for product {product_name}. Available: {current_stock}, Requested: {quantity}'
+                    print(error_msg)
+                    return {
+                        'inventoryStatus': 'failed',
+                        'message': error_msg,
+                        'deadlock_retries': deadlock_retries
+                    }
+                
+                found = {row[0] for row in rows}
+                for product_id in product_ids:
+                    if product_id not in found:
+                        print(f"Product {product_id} not found in inventory")
+                
+                updated_products = []
+                low_stock_alerts = []
+                for product_id, product_name, previous_stock, quantity, new_stock, category in rows:
+                    updated_products.append({
+                        'product_id': product_id,
+                        'product_name': product_name,
+                        'previous_stock': previous_stock,
+                        'new_stock': new_stock,
+                        'quantity_sold': quantity,
+                        'stock_status': thresholds.status(product_id, new_stock, category)
+                    })
+                    
+                    # Check for low stock (stock_thresholds, per product / category)
+                    if thresholds.is_alert(product_id, new_stock, category):
+                        low_stock_alerts.append({
+                            'product_id': product_id,
+                            'product_name': product_name,
+                            'current_stock': new_stock
+                        })
+                
+                result = {
+                    'inventoryStatus': 'success',
+                    'message': 'Inventory updated successfully',
+                    'updated_products': updated_products,
+                    'low_stock_alerts': low_stock_alerts
                 }
+                
+                # Update order status
+                execute_prepared(cur, 'order_set_status', ('processing', datetime.now(), str(order_id)))
+                execute_prepared(cur, 'inventory_apply_record', (order_id, json.dumps(result)))
+                
+                conn.commit()
+                break
             
-            # Update inventory
-            new_stock = current_stock - quantity
-            cur.execute("""
-                UPDATE inventory
-                SET stock_quantity = %s,
-                    updated_at = %s
-                WHERE product_id = %s
-            """, (new_stock, datetime.now(), product_id))
-            
-            updated_products.append({
-                'product_id': product_id,
-                'product_name': product_name,
-                'previous_stock': current_stock,
-                'new_stock': new_stock,
-                'quantity_sold': quantity
-            })
-            
-            # Check for low stock
-            if new_stock <= 10:
-                low_stock_alerts.append({
-                    'product_id': product_id,
-                    'product_name': product_name,
-                    'current_stock': new_stock
-                })
-        
-        # Update order status
-        cur.execute("""
-            UPDATE orders
-            SET status = 'processing', updated_at = %s
-            WHERE order_id = %s
-        """, (datetime.now(), str(order_id)))
+            except (errors.DeadlockDetected, errors.SerializationFailure) as e:
+                conn.rollback()
+                if deadlock_retries >= INVENTORY_DEADLOCK_RETRIES:
+                    raise
+                deadlock_retries += 1
+                print(f"Lock conflict, retry {deadlock_retries}/{INVENTORY_DEADLOCK_RETRIES}: {str(e)}")
+                time.sleep(INVENTORY_RETRY_BACKOFF * (2 ** (deadlock_retries - 1)) * (1 + random.random()))
         
-        conn.commit()
+        # Stok berubah, cache catalog di order_management jadi stale
+        bump_cache_version(conn, 'catalog')
         
-        # Send low stock events
-        if low_stock_alerts:
-            for alert in low_stock_alerts:
-                try:
-                    eventbridge.put_events(
-                        Entries=[{
-                            'Source': 'order.system',
-                            'DetailType': 'LowStock',
-                            'Detail': json.dumps({
-                                'product_id': alert['product_id'],
-                                'product_name': alert['product_name'],
-                                'current_stock': alert['current_stock'],
-                                'timestamp': datetime.now().isoformat()
-                            })
-                        }]
-                    )
-                except Exception as e:
-                    print(f"Error sending low stock event: {str(e)}")
+        # Send low stock events (batched + dedup)
+        low_stock_events = emit_low_stock_events(conn, low_stock_alerts) if low_stock_alerts else None
         
         print(f"Inventory updated successfully for order {order_id}")
         
-        return {
-            'inventoryStatus': 'success',
-            'message': 'Inventory updated successfully',
-            'updated_products': updated_products,
-            'low_stock_alerts': low_stock_alerts
-        }
+        result['low_stock_events'] = low_stock_events
+        result['deadlock_retries'] = deadlock_retries
+        result['replayed'] = False
+        return result
         
     except Exception as e:
         conn.rollback()
@@ -202,4 +549,4 @@ def lambda_handler(event, context):
         }
     finally:
         cur.close()
-        conn.close()
\ No newline at end of file
+        release_db_connection(conn)
\ No newline at end of file